@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'VorgabenUI.settings')
 
 application = get_asgi_application()
+
+# /diagramm/ is served on the event loop, everything else by Django
+from diagramm_proxy.asgi import DiagrammApp  # noqa: E402  (needs the app registry)
+
+application = DiagrammApp(application)
@@ -0,0 +1,109 @@
+"""
+Database routing for the SQLite deployment.
+
+Public read requests (GET/HEAD outside the Autorenumgebung) read content
+through the "readonly" alias, so the portal never holds write locks and cannot
+block edits in the admin. "readonly" is either a query_only connection to the
+live database or, with PUBLISHED_DB set, the immutable copy written by the
+publish command. Writes, including those made while serving a public page,
+always go to "default".
+"""
+from contextvars import ContextVar
+import os
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.urls import reverse
+
+READONLY_DB_ALIAS = "readonly"
+
+# Apps the public pages read; sessions, users etc. always come from default.
+INHALT_APPS = {"standards", "abschnitte", "stichworte", "referenzen", "rollen"}
+
+lese_alias = ContextVar("lese_alias", default=None)
+
+
+def _inode(path):
+    try:
+        return os.stat(path).st_ino
+    except OSError:
+        return None
+
+
+def reads_published():
+    """True while content is read from the published copy."""
+    return lese_alias.get() == READONLY_DB_ALIAS and bool(settings.PUBLISHED_DB)
+
+
+def set_journal_mode(using=DEFAULT_DB_ALIAS, **kwargs):
+    """Switches the database file to settings.SQLITE_JOURNAL_MODE; connected to post_migrate."""
+    connection = connections[using]
+    if connection.vendor != "sqlite" or connection.is_in_memory_db():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA journal_mode=%s" % settings.SQLITE_JOURNAL_MODE)
+
+
+@receiver(connection_created)
+def merke_inode(sender, connection, **kwargs):
+    # publish replaces the file, an open connection keeps reading the old one
+    if connection.alias == READONLY_DB_ALIAS and settings.PUBLISHED_DB:
+        connection.published_inode = _inode(settings.PUBLISHED_DB)
+
+
+def readonly_available():
+    """
+    False if there is no readonly alias, or PUBLISHED_DB is set but nothing
+    has been published yet. Closes a connection to an outdated copy.
+    """
+    if READONLY_DB_ALIAS not in settings.DATABASES:
+        return False
+    if not settings.PUBLISHED_DB:
+        return True
+    inode = _inode(settings.PUBLISHED_DB)
+    if inode is None:
+        # nothing published yet: read the live database
+        return False
+    connection = connections[READONLY_DB_ALIAS]
+    if connection.connection is not None and getattr(connection, "published_inode", None) != inode:
+        connection.close()
+    return True
+
+
+class ReadonlyRouter:
+    def db_for_read(self, model, **hints):
+        alias = lese_alias.get()
+        if alias and model._meta.app_label in INHALT_APPS:
+            return alias
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Objects read through "readonly" must still be saved to "default".
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same schema and, apart from publishing delay, the same rows.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != READONLY_DB_ALIAS
+
+
+class ReadonlyMiddleware:
+    """Routes the content reads of public GET/HEAD requests to the readonly alias."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.admin_prefix = None
+
+    def __call__(self, request):
+        if self.admin_prefix is None:
+            self.admin_prefix = reverse("admin:index")
+        lesend = request.method in ("GET", "HEAD") and not request.path.startswith(self.admin_prefix)
+        token = lese_alias.set(READONLY_DB_ALIAS if lesend and readonly_available() else None)
+        try:
+            return self.get_response(request)
+        finally:
+            lese_alias.reset(token)
@@ -50,6 +50,8 @@ INSTALLED_APPS = [
     'rollen',
     'mptt',
     'pages',
+    'diagramm_proxy',
+    'api',
     'nested_admin',
     'revproxy.apps.RevProxyConfig',
     'debug_toolbar',
@@ -64,6 +66,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'VorgabenUI.db.ReadonlyMiddleware',
 ]
 
 INTERNAL_IPS = [ "127.0.0.1","10.128.128.130"]
@@ -92,12 +95,88 @@ CSRF_TRUSTED_ORIGINS=["https://vorgabenportal.knowyoursecurity.com"]
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# All gunicorn workers of all replicas share one SQLite file on the data
+# volume (ReadWriteOnce, so every pod runs on the same node). WAL lets readers
+# run next to a writer; it needs all processes on one host, so set
+# SQLITE_JOURNAL_MODE=DELETE if the volume is ever mounted from several nodes.
+# The journal mode is stored in the database file, so it is set by "migrate"
+# (see VorgabenUI.db.set_journal_mode), not on every connection.
+SQLITE_JOURNAL_MODE = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+# per connection
+SQLITE_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL;"
+    "PRAGMA mmap_size=268435456;"  # 256 MiB
+    "PRAGMA cache_size=-32768;"  # 32 MiB
+    "PRAGMA temp_store=MEMORY;"
+)
+SQLITE_TIMEOUT = int(os.environ.get("SQLITE_TIMEOUT", 10))  # busy_timeout in seconds
+# Portal pods can read the content from an immutable copy written by the
+# "publish" command (SQLITE_PUBLISHED_DB=/app/data/published.sqlite3) while the
+# Autorenumgebung keeps writing the live database.
+PUBLISHED_DB = os.environ.get("SQLITE_PUBLISHED_DB") or None
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'data/db.sqlite3',
-    }
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': SQLITE_TIMEOUT,
+            # take the write lock at BEGIN instead of failing on lock upgrade
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': SQLITE_PRAGMAS,
+        },
+    },
+    # Content reads of public pages (see VorgabenUI.db): the published copy,
+    # or else the live file.
+    'readonly': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': "file:%s?mode=ro&immutable=1" % PUBLISHED_DB if PUBLISHED_DB else BASE_DIR / 'data/db.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': SQLITE_TIMEOUT,
+            'init_command': SQLITE_PRAGMAS + "PRAGMA query_only=1;",
+        },
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    },
+}
+DATABASE_ROUTERS = ['VorgabenUI.db.ReadonlyRouter']
+
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# "abschnitte" holds rendered Textabschnitt HTML. It lives on the data volume,
+# so all replicas share it; swap the backend here to use another store.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'abschnitte': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'data/cache/abschnitte',
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+        },
+    },
 }
+ABSCHNITTE_CACHE = 'abschnitte'
+# Rendered standard pages; keys contain the content version, so no invalidation.
+SEITEN_CACHE = 'default'
+
+# Diagrams are rendered by Kroki and kept on the data volume (see diagramm_proxy).
+KROKI_URL = os.environ.get("KROKI_URL", "http://svckroki:8000/")
+# Renders per process that may wait for Kroki at the same time.
+KROKI_MAX_PARALLEL = int(os.environ.get("KROKI_MAX_PARALLEL", "8"))
+DIAGRAMM_CACHE_DIR = BASE_DIR / 'data/cache/diagramme'
+DIAGRAMM_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# Embed the SVG into the stored HTML of diagram sections when they are saved,
+# so pages do not request diagrams at all.
+DIAGRAMME_EINBETTEN = os.environ.get("DIAGRAMME_EINBETTEN", "0") == "1"
 
 
 # Password validation
@@ -0,0 +1,60 @@
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+import os
+import tempfile
+
+from django.contrib.auth.models import User
+from django.db import router
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from standards.models import Standard
+from . import db
+
+
+class ReadonlyRoutingTest(SimpleTestCase):
+    """Public GET/HEAD requests read content from "readonly", everything else from "default"."""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        verzeichnis = tempfile.TemporaryDirectory()
+        self.addCleanup(verzeichnis.cleanup)
+        self.verzeichnis = Path(verzeichnis.name)
+
+    def lesen(self, request):
+        """The databases content and users are read from while serving request."""
+        middleware = db.ReadonlyMiddleware(lambda request: (
+            router.db_for_read(Standard), router.db_for_read(User), router.db_for_write(Standard),
+        ))
+        return middleware(request)
+
+    @override_settings(PUBLISHED_DB=None)
+    def test_reads_and_writes(self):
+        self.assertEqual(self.lesen(self.factory.get("/standards/")), ("readonly", "default", "default"))
+        self.assertEqual(self.lesen(self.factory.head("/standards/")), ("readonly", "default", "default"))
+        self.assertEqual(self.lesen(self.factory.post("/standards/")), ("default", "default", "default"))
+        self.assertEqual(self.lesen(self.factory.get("/autorenumgebung/standards/standard/")),
+                         ("default", "default", "default"))
+        # outside a request
+        self.assertEqual(router.db_for_read(Standard), "default")
+
+    def test_nothing_published_yet(self):
+        with self.settings(PUBLISHED_DB=str(self.verzeichnis / "published.sqlite3")):
+            self.assertFalse(db.readonly_available())
+            self.assertEqual(self.lesen(self.factory.get("/standards/")), ("default", "default", "default"))
+
+    def test_reconnects_after_publish(self):
+        published = self.verzeichnis / "published.sqlite3"
+        published.write_bytes(b"alt")
+        verbindung = SimpleNamespace(alias="readonly", connection=object(), close=mock.Mock())
+        with self.settings(PUBLISHED_DB=str(published)), \
+                mock.patch.object(db, "connections", {"readonly": verbindung}):
+            db.merke_inode(sender=None, connection=verbindung)
+            self.assertTrue(db.readonly_available())
+            verbindung.close.assert_not_called()
+
+            neu = self.verzeichnis / "neu.sqlite3"
+            neu.write_bytes(b"neu")
+            os.replace(neu, published)
+            self.assertTrue(db.readonly_available())
+            verbindung.close.assert_called_once_with()
@@ -19,7 +19,7 @@ from django.urls import include, path, re_path
 from django.conf import settings
 from django.conf.urls.static import static
 from debug_toolbar.toolbar import debug_toolbar_urls
-from diagramm_proxy.views import DiagrammProxyView
+import diagramm_proxy.views
 import standards.views
 import pages.views
 import referenzen.views
@@ -29,11 +29,15 @@ admin.site.site_header="Autorenumgebung"
 urlpatterns = [
     path('',pages.views.startseite),
     path('search/',pages.views.search),
+    path('search/api/',pages.views.search_api, name="search_api"),
+    path('health/',pages.views.health, name="health"),
     path('standards/', include("standards.urls")),
     path('autorenumgebung/', admin.site.urls),
     path('stichworte/', include("stichworte.urls")),
+    path('rollen/', include("rollen.urls")),
+    path('api/', include("api.urls")),
     path('referenzen/', referenzen.views.tree, name="referenz_tree"),
     path('referenzen/<str:refid>/', referenzen.views.detail, name="referenz_detail"),
-    re_path(r'^diagramm/(?P<path>.*)$', DiagrammProxyView.as_view()),
+    re_path(r'^diagramm/(?P<path>.*)$', diagramm_proxy.views.diagramm),
 ] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT) +debug_toolbar_urls()
 
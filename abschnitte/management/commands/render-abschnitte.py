@@ -0,0 +1,48 @@
+# abschnitte/management/commands/render-abschnitte.py
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from abschnitte.models import Textabschnitt
+
+
+class Command(BaseCommand):
+    help = (
+        "Render and store the HTML of all Textabschnitt rows (Kurztext, Langtext, "
+        "Geltungsbereich, Einleitung and all Erklaerungen/Beschreibungen).\n"
+        "By default only rows without stored HTML are rendered; use --all after "
+        "changing the renderer."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Re-render rows that already have HTML")
+        parser.add_argument("--batch-size", type=int, default=500, help="Rows per bulk update")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        total = 0
+
+        for model in apps.get_models():
+            if not issubclass(model, Textabschnitt):
+                continue
+
+            qs = model.objects.all()
+            if not options["all"]:
+                qs = qs.filter(html="").exclude(inhalt__isnull=True).exclude(inhalt="")
+            count = 0
+            with transaction.atomic():
+                # SQLite may skip or repeat rows of a table updated while it is
+                # being read, so the rows to render are fixed before the updates
+                pks = list(qs.order_by("pk").values_list("pk", flat=True))
+                for i in range(0, len(pks), batch_size):
+                    batch = list(model.objects.only("id", "abschnitttyp", "inhalt", "html")
+                                 .filter(pk__in=pks[i:i + batch_size]))
+                    for abschnitt in batch:
+                        abschnitt.render_html()
+                    model.objects.bulk_update(batch, ["html"])
+                    count += len(batch)
+
+            total += count
+            self.stdout.write(f"{model._meta.label}: {count} Abschnitte gerendert")
+
+        self.stdout.write(self.style.SUCCESS(f"{total} Abschnitte gerendert"))
@@ -0,0 +1,36 @@
+# abschnitte/management/commands/render-diagramme.py
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from abschnitte.utils import EINGEBETTET, stale_diagram_count, stale_diagrams
+
+
+class Command(BaseCommand):
+    help = (
+        "Embed the SVG of all diagram sections whose stored HTML still points to the diagram proxy "
+        "(new sections saved while Kroki was unavailable, or saved before DIAGRAMME_EINBETTEN was on).\n"
+        "With --count only the number of such stale diagrams is printed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", action="store_true", help="Only print the number of stale diagrams")
+
+    def handle(self, *args, **options):
+        if options["count"]:
+            self.stdout.write(str(stale_diagram_count()))
+            return
+        if not settings.DIAGRAMME_EINBETTEN:
+            raise CommandError("DIAGRAMME_EINBETTEN is off, diagrams would not be embedded")
+
+        eingebettet = veraltet = 0
+        for model, qs in stale_diagrams():
+            for abschnitt in qs:
+                # save() renders and embeds; the signals update versions and search index
+                abschnitt.save(update_fields=["html"])
+                if EINGEBETTET in abschnitt.html:
+                    eingebettet += 1
+                else:
+                    veraltet += 1
+        self.stdout.write(self.style.SUCCESS(f"{eingebettet} Diagramme eingebettet, {veraltet} weiterhin veraltet"))
+        if veraltet:
+            raise CommandError(f"{veraltet} Diagramme konnten nicht gerendert werden")
@@ -1,4 +1,6 @@
+from django.conf import settings
 from django.db import models
+from .utils import embed_diagram, render_abschnitt
 
 class AbschnittTyp(models.Model):
     abschnitttyp = models.CharField(max_length=100, primary_key=True)
@@ -16,6 +18,22 @@ class Textabschnitt(models.Model):
     )
     inhalt = models.TextField(blank=True, null=True)
     order=models.PositiveIntegerField(default=0)
+    # Rendered form of inhalt, kept up to date on save so views only read it.
+    html = models.TextField(blank=True, default="", editable=False)
+
+    def render_html(self):
+        self.html = render_abschnitt(self.abschnitttyp_id or '', self.inhalt or '')
+        if self.abschnitttyp_id == "diagramm" and self.inhalt and settings.DIAGRAMME_EINBETTEN:
+            # keeps the proxied image if Kroki is unavailable; render-diagramme retries
+            self.html = embed_diagram(self.inhalt) or self.html
+        return self.html
+
+    def save(self, *args, **kwargs):
+        self.render_html()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "html"}
+        super().save(*args, **kwargs)
 
     class Meta:
         abstract = True
@@ -1,3 +1,33 @@
-from django.test import TestCase
+from io import StringIO
 
-# Create your tests here.
+from django.core.management import call_command
+
+from standards.models import Einleitung, VorgabeLangtext
+from standards.tests import InhaltTestCase
+from .models import AbschnittTyp
+
+
+class StaleDiagramTest(InhaltTestCase):
+    def test_count(self):
+        standard = self.make_standard("KLEIN", 0)
+        diagramm = AbschnittTyp.objects.create(abschnitttyp="diagramm")
+        # saved while embedding is off, so the HTML points to the proxy
+        Einleitung.objects.create(einleitung=standard, abschnitttyp=diagramm, inhalt="plantuml\nA -> B")
+        out = StringIO()
+        call_command("render-diagramme", "--count", stdout=out)
+        self.assertEqual(out.getvalue().strip(), "1")
+
+
+class RenderAbschnitteTest(InhaltTestCase):
+    def test_renders_rows_without_html_in_batches(self):
+        self.make_standard("KLEIN", 3)
+        VorgabeLangtext.objects.update(html="")
+        out = StringIO()
+        call_command("render-abschnitte", "--batch-size", "2", stdout=out)
+        self.assertIn("standards.VorgabeLangtext: 6 Abschnitte gerendert", out.getvalue())
+        self.assertEqual(sorted(VorgabeLangtext.objects.values_list("html", flat=True)),
+                         ["<p>Lang 1</p>"] * 3 + ["<p>Lang 2</p>"] * 3)
+
+        out = StringIO()
+        call_command("render-abschnitte", stdout=out)
+        self.assertIn("standards.VorgabeLangtext: 0 Abschnitte gerendert", out.getvalue())
@@ -1,48 +1,127 @@
 from markdown import markdown
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches, DEFAULT_CACHE_ALIAS
+from functools import lru_cache
 import base64
+import hashlib
 import zlib
 import re
 from textwrap import dedent
 
 DIAGRAMMSERVER="/diagramm"
+# Marks diagram HTML that carries the SVG itself (see embed_diagram).
+EINGEBETTET='src="data:image/svg+xml;base64,'
+
+# Bump whenever the HTML produced by _render changes, so fragments rendered by
+# older code are no longer picked up from the shared cache.
+RENDERER_VERSION = 1
+LOKALER_CACHE_EINTRAEGE = 2048
 
 def render_textabschnitte(queryset):
     """
     Converts a queryset of Textabschnitt-like models into a list of (typ, html) tuples.
-    Applies special formatting for 'liste' and 'tabelle' types.
+    Uses the HTML stored on save and only renders sections that have none yet.
     """
     output = []
 
     for abschnitt in queryset:
-        typ = abschnitt.abschnitttyp.abschnitttyp if abschnitt.abschnitttyp else ''
-        inhalt = abschnitt.inhalt or ''
-        if typ == "liste ungeordnet":
-            inhalt = "\n".join(["- " + line for line in inhalt.splitlines()])
-            html = markdown(inhalt, extensions=['tables', 'attr_list'])
-        elif typ == "liste geordnet":
-            inhalt = "\n".join(["1. " + line for line in inhalt.splitlines()])
-            html = markdown(inhalt, extensions=['tables', 'attr_list'])
-        elif typ == "tabelle":
-            html = md_table_to_html(inhalt)
-        elif typ == "diagramm":
-            temp=inhalt.splitlines()
-            diagramtype=temp.pop(0)
-            diagramoptions='width="100%"'
-            if temp[0][0:6].lower() == "option":
-                diagramoptions=temp.pop(0).split(":",1)[1]
-            rest="\n".join(temp)
-            html = '<p><img '+diagramoptions+' src="'+DIAGRAMMSERVER+"/"+diagramtype+"/svg/"
-            html += base64.urlsafe_b64encode(zlib.compress(rest.encode("utf-8"),9)).decode()
-            html += '"></p>'
-        elif typ == "code":
-            html = "<pre><code>"
-            html += markdown(inhalt, extensions=['tables', 'attr_list'])
-            html += "</code></pre>"
-        else:
-            html = markdown(inhalt, extensions=['tables', 'attr_list','footnotes'])
+        # abschnitttyp is keyed by its name, so the id already is the typ and
+        # no join or extra query is needed.
+        typ = abschnitt.abschnitttyp_id or ''
+        html = abschnitt.html
+        if not html and abschnitt.inhalt:
+            html = render_abschnitt(typ, abschnitt.inhalt)
         output.append((typ, html))
     return output
 
+@lru_cache(maxsize=LOKALER_CACHE_EINTRAEGE)
+def render_abschnitt(typ, inhalt):
+    """
+    Returns the HTML for a single section. Results are cached in-process and in
+    the shared cache configured by settings.ABSCHNITTE_CACHE, keyed by typ, a
+    hash of the content and RENDERER_VERSION, so an unchanged section is only
+    converted once across all workers sharing that cache.
+    """
+    digest = hashlib.sha256(inhalt.encode("utf-8")).hexdigest()
+    key = "abschnitt:%s:%s:%s" % (RENDERER_VERSION, typ.replace(" ", "_"), digest)
+    store = caches[getattr(settings, "ABSCHNITTE_CACHE", DEFAULT_CACHE_ALIAS)]
+    html = store.get(key)
+    if html is None:
+        html = _render(typ, inhalt)
+        store.set(key, html, None)
+    return html
+
+def _render(typ, inhalt):
+    if typ == "liste ungeordnet":
+        inhalt = "\n".join(["- " + line for line in inhalt.splitlines()])
+        html = markdown(inhalt, extensions=['tables', 'attr_list'])
+    elif typ == "liste geordnet":
+        inhalt = "\n".join(["1. " + line for line in inhalt.splitlines()])
+        html = markdown(inhalt, extensions=['tables', 'attr_list'])
+    elif typ == "tabelle":
+        html = md_table_to_html(inhalt)
+    elif typ == "diagramm":
+        diagramtype, diagramoptions, quelle = diagramm_teile(inhalt)
+        html = '<p><img '+diagramoptions+' src="'+DIAGRAMMSERVER+"/"+diagramtype+"/svg/"
+        html += quelle
+        html += '"></p>'
+    elif typ == "code":
+        html = "<pre><code>"
+        html += markdown(inhalt, extensions=['tables', 'attr_list'])
+        html += "</code></pre>"
+    else:
+        html = markdown(inhalt, extensions=['tables', 'attr_list','footnotes'])
+    return html
+
+def abschnitt_markdown(typ, inhalt):
+    """Returns a section as Markdown, e.g. for exports."""
+    if typ == "liste ungeordnet":
+        return "\n".join(["- " + line for line in inhalt.splitlines()])
+    if typ == "liste geordnet":
+        return "\n".join(["1. " + line for line in inhalt.splitlines()])
+    if typ in ("code", "diagramm"):
+        return "```" + ("diagramm" if typ == "diagramm" else "") + "\n" + inhalt + "\n```"
+    return inhalt
+
+def diagramm_teile(inhalt):
+    """
+    Splits a "diagramm" section into (diagram type, img attributes, source)
+    with the source deflated and base64 encoded the way Kroki expects it.
+    """
+    temp=inhalt.splitlines()
+    diagramtype=temp.pop(0)
+    diagramoptions='width="100%"'
+    if temp[0][0:6].lower() == "option":
+        diagramoptions=temp.pop(0).split(":",1)[1]
+    rest="\n".join(temp)
+    return diagramtype, diagramoptions, base64.urlsafe_b64encode(zlib.compress(rest.encode("utf-8"),9)).decode()
+
+def embed_diagram(inhalt):
+    """
+    Returns the HTML of a "diagramm" section with the SVG from Kroki embedded
+    as a data URI, or None if the diagram cannot be rendered right now.
+    """
+    from diagramm_proxy.utils import KrokiError, get_diagram
+    diagramtype, diagramoptions, quelle = diagramm_teile(inhalt)
+    try:
+        _, svg = get_diagram(diagramtype, "svg", quelle)
+    except (KrokiError, OSError):
+        return None
+    return '<p><img '+diagramoptions+' '+EINGEBETTET+base64.b64encode(svg).decode()+'"></p>'
+
+def stale_diagrams():
+    """Yields (model, queryset) of the diagram sections whose HTML does not embed the SVG."""
+    from .models import Textabschnitt
+    for model in apps.get_models():
+        if issubclass(model, Textabschnitt):
+            yield model, (model.objects.filter(abschnitttyp_id="diagramm")
+                          .exclude(inhalt__isnull=True).exclude(inhalt="")
+                          .exclude(html__contains=EINGEBETTET))
+
+def stale_diagram_count():
+    return sum(qs.count() for _, qs in stale_diagrams())
+
 def md_table_to_html(md: str) -> str:
     # 1.  Split into lines and drop empties
     lines = [ln.strip() for ln in md.splitlines() if ln.strip()]
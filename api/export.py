@@ -0,0 +1,117 @@
+"""
+Dump of the whole corpus for downstream consumers.
+
+Two formats: NDJSON with one line per Standard (its fields as in the API
+plus all its Vorgaben with every field), or a zip with <nummer>.json and
+<nummer>.md per Standard. Standards are read in chunks of chunk_size, and the
+Vorgaben of a whole chunk are loaded with one query plus one per prefetched
+relation, so the number of queries grows with the number of chunks and memory
+does not grow with the size of the corpus.
+"""
+import io
+import json
+import zipfile
+from collections import defaultdict
+from itertools import islice
+
+from abschnitte.utils import abschnitt_markdown
+from .utils import STANDARDS, VORGABEN
+
+CHUNK_SIZE = 200
+
+STANDARD_FELDER = [f for f in STANDARDS.felder if f != "vorgaben"]
+VORGABE_FELDER = list(VORGABEN.felder)
+
+
+def standards(using=None, chunk_size=CHUNK_SIZE):
+    """Yields (standard, vorgaben) with everything the dumps need prefetched."""
+    alle = STANDARDS.queryset(STANDARD_FELDER, None).using(using).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(alle, chunk_size))
+        if not chunk:
+            return
+        vorgaben = defaultdict(list)
+        for v in (VORGABEN.queryset(VORGABE_FELDER, None).using(using)
+                  .filter(dokument__in=chunk).order_by("dokument", "thema", "nummer")):
+            vorgaben[v.dokument_id].append(v)
+        for standard in chunk:
+            yield standard, vorgaben[standard.nummer]
+
+
+def standard_json(standard, vorgaben):
+    daten = STANDARDS.serialize(standard, STANDARD_FELDER)
+    daten["vorgaben"] = [VORGABEN.serialize(v, VORGABE_FELDER) for v in vorgaben]
+    return json.dumps(daten, ensure_ascii=False)
+
+
+def _abschnitte(abschnitte):
+    return "\n\n".join(abschnitt_markdown(a.abschnitttyp_id or "", a.inhalt) for a in abschnitte if a.inhalt)
+
+
+def standard_markdown(standard, vorgaben):
+    teile = ["# %s – %s" % (standard.nummer, standard.name)]
+    for titel, abschnitte in (("Einleitung", standard.einleitung_set.all()),
+                              ("Geltungsbereich", standard.geltungsbereich_set.all())):
+        text = _abschnitte(abschnitte)
+        if text:
+            teile += ["## " + titel, text]
+    teile.append("## Vorgaben")
+    for v in vorgaben:
+        teile.append("### %s: %s" % (v.Vorgabennummer(), v.titel))
+        teile.append("Gültig ab %s%s" % (
+            v.gueltigkeit_von.strftime("%d.%m.%Y"),
+            " bis " + v.gueltigkeit_bis.strftime("%d.%m.%Y") if v.gueltigkeit_bis else "",
+        ))
+        for text in (_abschnitte(v.vorgabekurztext_set.all()), _abschnitte(v.vorgabelangtext_set.all())):
+            if text:
+                teile.append(text)
+        for titel, werte in (("Stichworte", [str(s) for s in v.stichworte.all()]),
+                             ("Referenzen", [r.Path() for r in v.referenzen.all()]),
+                             ("Relevant für", [str(r) for r in v.relevanz.all()])):
+            if werte:
+                teile.append("**%s:** %s" % (titel, ", ".join(werte)))
+        fragen = [f.frage for f in v.checklistenfragen.all()]
+        if fragen:
+            teile.append("**Checkliste:**\n\n" + "\n".join("- [ ] " + f for f in fragen))
+    return "\n\n".join(teile) + "\n"
+
+
+def ndjson_stream(using=None, chunk_size=CHUNK_SIZE):
+    for standard, vorgaben in standards(using, chunk_size):
+        yield standard_json(standard, vorgaben) + "\n"
+
+
+class _Puffer(io.RawIOBase):
+    """Unseekable file for ZipFile whose content is handed out piece by piece."""
+
+    def __init__(self):
+        self.teile = []
+
+    def writable(self):
+        return True
+
+    def write(self, daten):
+        self.teile.append(bytes(daten))
+        return len(daten)
+
+    def abholen(self):
+        daten = b"".join(self.teile)
+        self.teile.clear()
+        return daten
+
+
+def zip_stream(using=None, chunk_size=CHUNK_SIZE):
+    puffer = _Puffer()
+    with zipfile.ZipFile(puffer, "w", zipfile.ZIP_DEFLATED) as zf:
+        for standard, vorgaben in standards(using, chunk_size):
+            name = standard.nummer.replace("/", "_")
+            zf.writestr(name + ".json", standard_json(standard, vorgaben))
+            zf.writestr(name + ".md", standard_markdown(standard, vorgaben))
+            yield puffer.abholen()
+    yield puffer.abholen()
+
+
+FORMATE = {
+    "ndjson": (ndjson_stream, "application/x-ndjson; charset=utf-8"),
+    "zip": (zip_stream, "application/zip"),
+}
@@ -0,0 +1,39 @@
+# api/management/commands/export-corpus.py
+import os
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from api.export import CHUNK_SIZE, FORMATE
+
+
+class Command(BaseCommand):
+    help = (
+        "Dump all Standards with their Vorgaben, sections, references and keywords, either as NDJSON "
+        "(one Standard per line) or as a zip with a JSON and a Markdown file per Standard.\n"
+        "The file is replaced atomically when the dump is complete."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("ziel", help="Target file (.ndjson or .zip)")
+        parser.add_argument("--format", choices=sorted(FORMATE), help="Default: from the file extension, else ndjson")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows fetched per query (default: %(default)s)")
+
+    def handle(self, *args, **options):
+        ziel = Path(options["ziel"])
+        fmt = options["format"] or ("zip" if ziel.suffix == ".zip" else "ndjson")
+        stream, _ = FORMATE[fmt]
+        tmp = ziel.with_name(f".{ziel.name}.{os.getpid()}.tmp")
+        start = time.monotonic()
+        try:
+            with open(tmp, "wb") as f:
+                for teil in stream(chunk_size=options["chunk_size"]):
+                    f.write(teil.encode("utf-8") if isinstance(teil, str) else teil)
+            os.replace(tmp, ziel)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported to {ziel} ({fmt}, {ziel.stat().st_size / 1024:.0f} KiB) in {time.monotonic() - start:.2f}s"
+        ))
@@ -0,0 +1,150 @@
+from io import BytesIO, StringIO
+from pathlib import Path
+import json
+import tempfile
+import zipfile
+
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from standards.models import Vorgabe
+from standards.tests import InhaltTestCase
+from . import export
+from .utils import encode_cursor
+
+ALLE_FELDER = "nummer,kurztext,langtext,stichworte,referenzen,rollen,checkliste"
+
+
+class ApiTest(InhaltTestCase):
+    """The API serializes from prefetched data and answers repeated polls with 304."""
+
+    def test_query_count_is_constant(self):
+        self.make_standard("KLEIN", 1)
+        # version lookup for the ETag, Vorgaben with dokument/thema, one per prefetched relation
+        with self.assertNumQueries(8):
+            response = self.client.get("/api/vorgaben/", {"fields": ALLE_FELDER})
+        self.assertEqual(len(response.json()["results"]), 1)
+
+        self.make_standard("GROSS", 20)
+        with self.assertNumQueries(8):
+            response = self.client.get("/api/vorgaben/", {"fields": ALLE_FELDER})
+        vorgaben = response.json()["results"]
+        self.assertEqual(len(vorgaben), 21)
+        self.assertIn("ISO 27001 → A.8 → A.8.19", vorgaben[-1]["referenzen"])
+
+    def test_cursor_and_etag(self):
+        self.make_standard("GROSS", 5)
+        erste = self.client.get("/api/vorgaben/", {"limit": 3})
+        zweite = self.client.get(erste.json()["next"])
+        ids = [v["id"] for v in erste.json()["results"] + zweite.json()["results"]]
+        self.assertEqual(ids, sorted(Vorgabe.objects.values_list("id", flat=True)))
+        self.assertIsNone(zweite.json()["next"])
+
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/vorgaben/", {"limit": 3}, HTTP_IF_NONE_MATCH=erste["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+        Vorgabe.objects.first().save()
+        response = self.client.get("/api/vorgaben/", {"limit": 3}, HTTP_IF_NONE_MATCH=erste["ETag"])
+        self.assertEqual(response.status_code, 200)
+
+    def test_as_of_and_fields(self):
+        self.make_standard("KLEIN", 2)
+        response = self.client.get("/api/standards/KLEIN/", {"fields": "nummer,vorgaben", "as_of": "2019-12-31"})
+        self.assertEqual(response.json(), {"nummer": "KLEIN", "vorgaben": []})
+        response = self.client.get("/api/vorgaben/", {"fields": "nummer,unbekannt"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_crafted_cursor(self):
+        self.make_standard("KLEIN", 1)
+        for wert in ({"a": 1}, [1], None, True):
+            response = self.client.get("/api/vorgaben/", {"cursor": encode_cursor(wert)})
+            self.assertEqual(response.status_code, 400)
+        response = self.client.get("/api/vorgaben/", {"cursor": encode_cursor("abc")})
+        self.assertEqual(response.status_code, 400)
+
+    def test_detail_etag_follows_own_content(self):
+        klein = self.make_standard("KLEIN", 1)
+        gross = self.make_standard("GROSS", 1)
+        standard = self.client.get("/api/standards/KLEIN/")
+        vorgabe = self.client.get("/api/vorgaben/%d/" % klein.vorgaben.get().pk)
+        stichwort = self.client.get("/api/stichworte/Container/")
+
+        def unveraendert(url, alt):
+            return self.client.get(url, HTTP_IF_NONE_MATCH=alt["ETag"]).status_code == 304
+
+        gross.vorgaben.get().save()
+        self.assertTrue(unveraendert("/api/standards/KLEIN/", standard))
+        self.assertTrue(unveraendert("/api/vorgaben/%d/" % klein.vorgaben.get().pk, vorgabe))
+        # the Stichwort lists Vorgaben of both Standards
+        self.assertFalse(unveraendert("/api/stichworte/Container/", stichwort))
+
+        klein.vorgaben.get().save()
+        self.assertFalse(unveraendert("/api/standards/KLEIN/", standard))
+        self.assertFalse(unveraendert("/api/vorgaben/%d/" % klein.vorgaben.get().pk, vorgabe))
+        self.assertEqual(self.client.get("/api/vorgaben/abc/").status_code, 404)
+
+
+class ExportTest(InhaltTestCase):
+    """The corpus dump contains every Standard and loads the Vorgaben per chunk of Standards."""
+
+    def setUp(self):
+        self.make_standard("KLEIN", 1)
+        self.make_standard("GROSS", 2)
+
+    def pruefe_json(self, daten, nummer, anzahl):
+        self.assertEqual(daten["nummer"], nummer)
+        self.assertEqual(daten["einleitung"], ["<p>Einleitung</p>"])
+        self.assertEqual([v["nummer"] for v in daten["vorgaben"]], ["%s.T.%d" % (nummer, i) for i in range(anzahl)])
+        vorgabe = daten["vorgaben"][0]
+        self.assertEqual(vorgabe["langtext"], ["<p>Lang 1</p>", "<p>Lang 2</p>"])
+        self.assertEqual(vorgabe["stichworte"], ["Container"])
+        self.assertIn("ISO 27001 → A.8 → A.8.0", vorgabe["referenzen"])
+        self.assertEqual(vorgabe["checkliste"], ["Erfüllt?"])
+
+    def test_ndjson(self):
+        response = self.client.get("/api/export/")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson; charset=utf-8")
+        zeilen = b"".join(response.streaming_content).decode("utf-8").splitlines()
+        standards = [json.loads(z) for z in zeilen]
+        self.assertEqual([s["nummer"] for s in standards], ["GROSS", "KLEIN"])
+        self.pruefe_json(standards[0], "GROSS", 2)
+        self.pruefe_json(standards[1], "KLEIN", 1)
+
+    def test_zip(self):
+        response = self.client.get("/api/export/", {"format": "zip"})
+        with zipfile.ZipFile(BytesIO(b"".join(response.streaming_content))) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(sorted(zf.namelist()), ["GROSS.json", "GROSS.md", "KLEIN.json", "KLEIN.md"])
+            self.pruefe_json(json.loads(zf.read("KLEIN.json")), "KLEIN", 1)
+            markdown = zf.read("GROSS.md").decode("utf-8")
+        self.assertTrue(markdown.startswith("# GROSS – GROSS\n\n## Einleitung\n\nEinleitung\n"))
+        self.assertIn("### GROSS.T.1: Vorgabe 1\n\nGültig ab 01.01.2020\n\nKurz\n\nLang 1\n\nLang 2", markdown)
+        self.assertIn("**Checkliste:**\n\n- [ ] Erfüllt?", markdown)
+
+    def test_queries_per_chunk(self):
+        def abfragen(chunk_size):
+            with CaptureQueriesContext(connection) as queries:
+                list(export.ndjson_stream(chunk_size=chunk_size))
+            return len(queries)
+
+        # Standards with 4 prefetches, Vorgaben with 6 prefetches, per chunk
+        self.assertEqual(abfragen(10), 12)
+        self.make_standard("MEHR", 3)
+        self.assertEqual(abfragen(10), 12)
+        self.assertEqual(abfragen(2), 23)
+
+    def test_export_corpus(self):
+        verzeichnis = tempfile.TemporaryDirectory()
+        self.addCleanup(verzeichnis.cleanup)
+        ziel = Path(verzeichnis.name)
+
+        call_command("export-corpus", str(ziel / "dump.ndjson"), "--chunk-size", "1", stdout=StringIO())
+        zeilen = (ziel / "dump.ndjson").read_text(encoding="utf-8").splitlines()
+        self.assertEqual([json.loads(z)["nummer"] for z in zeilen], ["GROSS", "KLEIN"])
+
+        call_command("export-corpus", str(ziel / "dump.zip"), stdout=StringIO())
+        with zipfile.ZipFile(ziel / "dump.zip") as zf:
+            self.assertEqual(sorted(zf.namelist()), ["GROSS.json", "GROSS.md", "KLEIN.json", "KLEIN.md"])
+        self.assertEqual(sorted(p.name for p in ziel.iterdir()), ["dump.ndjson", "dump.zip"])
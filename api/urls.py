@@ -0,0 +1,8 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('export/', views.export, name='api_export'),
+    path('<str:ressource>/', views.liste, name='api_liste'),
+    path('<str:ressource>/<str:schluessel>/', views.detail, name='api_detail'),
+]
@@ -0,0 +1,181 @@
+"""
+Resources of the read API and how their fields are serialized.
+
+Every field names the select_related/prefetch_related lookups it needs, so a
+request only loads the relations of the fields it asked for (?fields=) and
+runs a constant number of queries however many objects it returns. Lookups
+may depend on the ?as_of= date and are then given as functions of it.
+
+The Inhaltsversion keys behind a single object are given by its resource as a
+Q, so the ETag of a detail response only changes with the object's content.
+"""
+import base64
+import json
+
+from django.db.models import CharField, Prefetch, Q, Value
+from django.db.models.functions import Concat
+
+from abschnitte.utils import render_textabschnitte
+from referenzen.models import Referenz, Referenzerklaerung
+from rollen.models import Rolle, RollenBeschreibung
+from standards.models import Einleitung, Geltungsbereich, Standard, Vorgabe, VorgabeKurztext, VorgabeLangtext
+from standards.utils import VERZEICHNIS_KEY, standard_key
+from stichworte.models import Stichwort, Stichworterklaerung
+
+
+class Feld:
+    def __init__(self, wert, select=(), prefetch=()):
+        self.wert = wert
+        self.select = select
+        self.prefetch = prefetch
+
+
+class Ressource:
+    def __init__(self, model, schluessel, felder, standard_felder, versionen, filter=None):
+        self.model = model
+        self.schluessel = schluessel
+        self.felder = felder
+        self.standard_felder = standard_felder
+        # key of an object -> Q of the Inhaltsversion rows its content depends on
+        self.versionen = versionen
+        self.filter = filter
+
+    def queryset(self, felder, as_of):
+        qs = self.model.objects.order_by(self.schluessel)
+        if self.filter:
+            qs = self.filter(qs, as_of)
+        select = {s for f in felder for s in self.felder[f].select}
+        if select:
+            qs = qs.select_related(*select)
+        for f in felder:
+            for p in self.felder[f].prefetch:
+                qs = qs.prefetch_related(p(as_of) if callable(p) else p)
+        return qs
+
+    def serialize(self, obj, felder):
+        return {f: self.felder[f].wert(obj) for f in felder}
+
+
+def _datum(d):
+    return d.isoformat() if d else None
+
+
+def _vorgaben(as_of):
+    """Vorgaben for nested lists: in force on as_of if given, otherwise all."""
+    vorgaben = Vorgabe.objects.select_related("dokument", "thema").order_by("dokument", "thema", "nummer")
+    return vorgaben.active_on(as_of) if as_of else vorgaben
+
+
+def _vorgaben_prefetch(lookup):
+    return lambda as_of: Prefetch(lookup, queryset=_vorgaben(as_of), to_attr="api_vorgaben")
+
+
+def _vorgabennummern(obj):
+    return [v.Vorgabennummer() for v in obj.api_vorgaben]
+
+
+def _html(abschnitte):
+    return [html for _, html in render_textabschnitte(abschnitte)]
+
+
+def _geordnet(lookup, model):
+    return lambda as_of: Prefetch(lookup, queryset=model.objects.order_by("order"))
+
+
+def _standard_versionen(vorgaben):
+    """Q for the versions of the Standards the given Vorgaben belong to."""
+    schluessel = vorgaben.annotate(
+        schluessel=Concat(Value(standard_key("")), "dokument_id", output_field=CharField()),
+    ).values("schluessel")
+    return Q(schluessel__in=schluessel)
+
+
+def _verzeichnis_versionen(**vorgaben):
+    """Directory objects: their own texts plus the Standards of their Vorgaben."""
+    return Q(schluessel=VERZEICHNIS_KEY) | _standard_versionen(Vorgabe.objects.filter(**vorgaben))
+
+
+STANDARDS = Ressource(Standard, "nummer", {
+    "nummer": Feld(lambda s: s.nummer),
+    "name": Feld(lambda s: s.name),
+    "dokumententyp": Feld(lambda s: s.dokumententyp_id),
+    "gueltigkeit_von": Feld(lambda s: _datum(s.gueltigkeit_von)),
+    "gueltigkeit_bis": Feld(lambda s: _datum(s.gueltigkeit_bis)),
+    "autoren": Feld(lambda s: [p.name for p in s.autoren.all()], prefetch=["autoren"]),
+    "pruefende": Feld(lambda s: [p.name for p in s.pruefende.all()], prefetch=["pruefende"]),
+    "geltungsbereich": Feld(lambda s: _html(s.geltungsbereich_set.all()), prefetch=[_geordnet("geltungsbereich_set", Geltungsbereich)]),
+    "einleitung": Feld(lambda s: _html(s.einleitung_set.all()), prefetch=[_geordnet("einleitung_set", Einleitung)]),
+    "vorgaben": Feld(_vorgabennummern, prefetch=[_vorgaben_prefetch("vorgaben")]),
+}, ["nummer", "name", "dokumententyp", "gueltigkeit_von", "gueltigkeit_bis"],
+    versionen=lambda nummer: Q(schluessel=standard_key(nummer)))
+
+VORGABEN = Ressource(Vorgabe, "id", {
+    "id": Feld(lambda v: v.id),
+    "nummer": Feld(lambda v: v.Vorgabennummer(), select=["dokument", "thema"]),
+    "standard": Feld(lambda v: v.dokument_id),
+    "thema": Feld(lambda v: v.thema_id),
+    "titel": Feld(lambda v: v.titel),
+    "gueltigkeit_von": Feld(lambda v: _datum(v.gueltigkeit_von)),
+    "gueltigkeit_bis": Feld(lambda v: _datum(v.gueltigkeit_bis)),
+    "status": Feld(lambda v: v.status),
+    "kurztext": Feld(lambda v: _html(v.vorgabekurztext_set.all()), prefetch=[_geordnet("vorgabekurztext_set", VorgabeKurztext)]),
+    "langtext": Feld(lambda v: _html(v.vorgabelangtext_set.all()), prefetch=[_geordnet("vorgabelangtext_set", VorgabeLangtext)]),
+    "stichworte": Feld(lambda v: [s.stichwort for s in v.stichworte.all()], prefetch=["stichworte"]),
+    "referenzen": Feld(lambda v: [r.Path() for r in v.referenzen.all()], prefetch=["referenzen"]),
+    "rollen": Feld(lambda v: [r.name for r in v.relevanz.all()], prefetch=["relevanz"]),
+    "checkliste": Feld(lambda v: [f.frage for f in v.checklistenfragen.all()], prefetch=["checklistenfragen"]),
+}, ["id", "nummer", "standard", "titel", "gueltigkeit_von", "gueltigkeit_bis", "status"],
+    versionen=lambda id: _standard_versionen(Vorgabe.objects.filter(pk=id)),
+    # with as_of only the Vorgaben in force then, status relative to it
+    filter=lambda qs, as_of: (qs.active_on(as_of) if as_of else qs).annotate_status(as_of))
+
+STICHWORTE = Ressource(Stichwort, "stichwort", {
+    "stichwort": Feld(lambda s: s.stichwort),
+    "buchstabe": Feld(lambda s: s.buchstabe),
+    "erklaerung": Feld(lambda s: _html(s.stichworterklaerung_set.all()), prefetch=[_geordnet("stichworterklaerung_set", Stichworterklaerung)]),
+    "vorgaben": Feld(_vorgabennummern, prefetch=[_vorgaben_prefetch("vorgabe_set")]),
+}, ["stichwort", "vorgaben"],
+    versionen=lambda stichwort: _verzeichnis_versionen(stichworte=stichwort))
+
+REFERENZEN = Ressource(Referenz, "id", {
+    "id": Feld(lambda r: r.id),
+    "name_nummer": Feld(lambda r: r.name_nummer),
+    "name_text": Feld(lambda r: r.name_text),
+    "pfad": Feld(lambda r: r.Path()),
+    "url": Feld(lambda r: r.url),
+    "oberreferenz": Feld(lambda r: r.oberreferenz_id),
+    "erklaerung": Feld(lambda r: _html(r.referenzerklaerung_set.all()), prefetch=[_geordnet("referenzerklaerung_set", Referenzerklaerung)]),
+    "vorgaben": Feld(_vorgabennummern, prefetch=[_vorgaben_prefetch("vorgabe_set")]),
+}, ["id", "name_nummer", "name_text", "pfad", "oberreferenz", "vorgaben"],
+    versionen=lambda id: _verzeichnis_versionen(referenzen=id))
+
+ROLLEN = Ressource(Rolle, "name", {
+    "name": Feld(lambda r: r.name),
+    "beschreibung": Feld(lambda r: _html(r.rollenbeschreibung_set.all()), prefetch=[_geordnet("rollenbeschreibung_set", RollenBeschreibung)]),
+    "vorgaben": Feld(_vorgabennummern, prefetch=[_vorgaben_prefetch("vorgabe_set")]),
+}, ["name", "vorgaben"],
+    versionen=lambda name: _verzeichnis_versionen(relevanz=name))
+
+RESSOURCEN = {
+    "standards": STANDARDS,
+    "vorgaben": VORGABEN,
+    "stichworte": STICHWORTE,
+    "referenzen": REFERENZEN,
+    "rollen": ROLLEN,
+}
+
+
+def encode_cursor(wert):
+    return base64.urlsafe_b64encode(json.dumps(wert).encode("utf-8")).decode()
+
+
+def decode_cursor(cursor):
+    """Raises ValueError for cursors not made by encode_cursor."""
+    try:
+        wert = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (UnicodeError, ValueError, TypeError) as e:
+        raise ValueError("invalid cursor") from e
+    # keys are numbers or strings; anything else cannot come from encode_cursor
+    if isinstance(wert, bool) or not isinstance(wert, (int, str)):
+        raise ValueError("invalid cursor")
+    return wert
@@ -0,0 +1,134 @@
+import hashlib
+from datetime import date
+
+from django.db import router
+from django.db.models import Count, Max
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+from standards.models import Inhaltsversion, Standard
+from .export import FORMATE
+from .utils import RESSOURCEN, decode_cursor, encode_cursor
+
+SEITENGROESSE = 100
+MAX_SEITENGROESSE = 1000
+
+
+def _ressource(name):
+    try:
+        return RESSOURCEN[name]
+    except KeyError:
+        raise Http404("unknown resource")
+
+
+def _parameter(ressource, params):
+    """Returns (fields, as_of) from the query string; raises ValueError for invalid ones."""
+    felder = ressource.standard_felder
+    if params.get("fields"):
+        felder = [f for f in params["fields"].split(",") if f]
+        unbekannt = [f for f in felder if f not in ressource.felder]
+        if unbekannt:
+            raise ValueError("unknown fields: %s (available: %s)" % (", ".join(unbekannt), ", ".join(ressource.felder)))
+    as_of = date.fromisoformat(params["as_of"]) if params.get("as_of") else None
+    return felder, as_of
+
+
+def _etag(request, versionen=None):
+    """
+    Strong ETag of a response: any content change bumps an Inhaltsversion,
+    and without as_of the status of a Vorgabe also depends on today's date.
+    Lists depend on all versions, a single object only on those in versionen.
+    """
+    if versionen is None:
+        versionen = Inhaltsversion.objects.aggregate(max=Max("geaendert"), anzahl=Count("pk"))
+        stand = "%s|%s" % (versionen["max"], versionen["anzahl"])
+    else:
+        stand = list(Inhaltsversion.objects.filter(versionen).order_by("schluessel").values_list("schluessel", "geaendert"))
+    quelle = "%s|%s|%s" % (stand, date.today(), request.get_full_path())
+    return quote_etag(hashlib.sha256(quelle.encode("utf-8")).hexdigest())
+
+
+def _antwort(request, daten, etag):
+    response = JsonResponse(daten)
+    response["ETag"] = etag
+    # clients revalidate every time and usually get a 304
+    response["Cache-Control"] = "no-cache"
+    return response
+
+
+def _fehler(meldung):
+    return JsonResponse({"error": meldung}, status=400)
+
+
+def liste(request, ressource):
+    """
+    Objects of a resource ordered by their key, ?limit= per page. The "next"
+    URL carries an opaque ?cursor= with the last key, so pages stay stable
+    while content changes.
+    """
+    ressource = _ressource(ressource)
+    try:
+        felder, as_of = _parameter(ressource, request.GET)
+        limit = min(max(int(request.GET.get("limit", SEITENGROESSE)), 1), MAX_SEITENGROESSE)
+        qs = ressource.queryset(felder, as_of)
+        if request.GET.get("cursor"):
+            qs = qs.filter(**{ressource.schluessel + "__gt": decode_cursor(request.GET["cursor"])})
+    except (TypeError, ValueError) as e:
+        return _fehler(str(e))
+
+    etag = _etag(request)
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        response["ETag"] = etag
+        return response
+
+    objekte = list(qs[:limit + 1])
+    weiter = None
+    if len(objekte) > limit:
+        objekte = objekte[:limit]
+        params = request.GET.copy()
+        params["cursor"] = encode_cursor(getattr(objekte[-1], ressource.schluessel))
+        weiter = request.path + "?" + params.urlencode()
+    return _antwort(request, {
+        "results": [ressource.serialize(o, felder) for o in objekte],
+        "next": weiter,
+    }, etag)
+
+
+def detail(request, ressource, schluessel):
+    ressource = _ressource(ressource)
+    try:
+        felder, as_of = _parameter(ressource, request.GET)
+    except ValueError as e:
+        return _fehler(str(e))
+    try:
+        versionen = ressource.versionen(schluessel)
+    except ValueError:
+        raise Http404("not found")
+
+    etag = _etag(request, versionen)
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        response["ETag"] = etag
+        return response
+
+    try:
+        obj = ressource.queryset(felder, as_of).filter(**{ressource.schluessel: schluessel}).first()
+    except ValueError:
+        obj = None
+    if obj is None:
+        raise Http404("not found")
+    return _antwort(request, ressource.serialize(obj, felder), etag)
+
+
+def export(request):
+    """The whole corpus as ?format=ndjson (default) or zip, see api.export."""
+    fmt = request.GET.get("format", "ndjson")
+    if fmt not in FORMATE:
+        return _fehler("format must be %s" % " or ".join(sorted(FORMATE)))
+    stream, content_type = FORMATE[fmt]
+    # streamed after the routing middleware returned, so the database is chosen now
+    response = StreamingHttpResponse(stream(using=router.db_for_read(Standard)), content_type=content_type)
+    response["Content-Disposition"] = 'attachment; filename="vorgaben-%s.%s"' % (date.today().isoformat(), fmt)
+    return response
@@ -0,0 +1,80 @@
+"""
+ASGI front for /diagramm/.
+
+Diagram requests are answered on the event loop without going through
+Django, so a slow Kroki does not hold a worker: cache hits are read in a
+thread, misses are rendered by get_diagram (pooled keep-alive connections,
+timeouts and circuit breaker, see utils) in at most KROKI_MAX_PARALLEL
+threads per process, and concurrent misses for the same diagram share one
+render. Everything else, including diagram requests the cache does not
+handle, is passed to the Django application.
+"""
+import asyncio
+
+from django.conf import settings
+from django.utils.http import quote_etag
+
+from .utils import KrokiError, _read, cache_key, cache_path, get_diagram
+from .views import CONTENT_TYPES, DIAGRAMM_PFAD
+
+PREFIX = "/diagramm/"
+
+
+class DiagrammApp:
+    def __init__(self, django_app):
+        self.django_app = django_app
+        self.semaphore = asyncio.Semaphore(settings.KROKI_MAX_PARALLEL)
+        self.laufend = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] in ("GET", "HEAD"):
+            path = scope["path"][len(scope.get("root_path", "")):]
+            m = DIAGRAMM_PFAD.match(path[len(PREFIX):]) if path.startswith(PREFIX) else None
+            if m:
+                return await self.diagramm(scope, send, m["typ"], m["fmt"], m["quelle"])
+        return await self.django_app(scope, receive, send)
+
+    async def render(self, typ, fmt, quelle):
+        async with self.semaphore:
+            _, daten = await asyncio.to_thread(get_diagram, typ, fmt, quelle)
+        return daten
+
+    async def get(self, key, typ, fmt, quelle):
+        daten = await asyncio.to_thread(_read, cache_path(key))
+        if daten is not None:
+            return daten
+        task = self.laufend.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self.render(typ, fmt, quelle))
+            self.laufend[key] = task
+            task.add_done_callback(lambda t: self.laufend.pop(key, None))
+        # a client going away must not cancel the render the others wait for
+        return await asyncio.shield(task)
+
+    async def diagramm(self, scope, send, typ, fmt, quelle):
+        key = cache_key(typ, fmt, quelle)
+        etag = quote_etag(key)
+        headers = {}
+        for name, wert in scope["headers"]:
+            headers[name.decode("latin-1").lower()] = wert.decode("latin-1")
+
+        if etag in headers.get("if-none-match", ""):
+            status, daten, content_type = 304, b"", None
+        else:
+            try:
+                daten = await self.get(key, typ, fmt, quelle)
+            except KrokiError as e:
+                return await self.respond(send, scope, 502, str(e).encode(), "text/plain", [(b"cache-control", b"no-store")])
+            status, content_type = 200, CONTENT_TYPES[fmt]
+        await self.respond(send, scope, status, daten, content_type, [
+            (b"etag", etag.encode()),
+            (b"cache-control", b"public, max-age=31536000, immutable"),
+        ])
+
+    async def respond(self, send, scope, status, daten, content_type, headers):
+        if content_type:
+            headers.append((b"content-type", content_type.encode()))
+        if status != 304:
+            headers.append((b"content-length", str(len(daten)).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": b"" if scope["method"] == "HEAD" else daten})
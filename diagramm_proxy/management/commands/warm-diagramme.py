@@ -0,0 +1,42 @@
+# diagramm_proxy/management/commands/warm-diagramme.py
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from abschnitte.models import Textabschnitt
+from abschnitte.utils import diagramm_teile
+from diagramm_proxy.utils import KrokiError, cache_key, cache_path, get_diagram, prune
+
+
+class Command(BaseCommand):
+    help = (
+        "Render all diagrams stored in Textabschnitte into the local diagram cache, "
+        "so no page view has to wait for Kroki."
+    )
+
+    def handle(self, *args, **options):
+        vorhanden = gerendert = fehler = 0
+        quellen = set()
+        for model in apps.get_models():
+            if not issubclass(model, Textabschnitt):
+                continue
+            for inhalt in model.objects.filter(abschnitttyp_id="diagramm").values_list("inhalt", flat=True):
+                if inhalt:
+                    typ, _, quelle = diagramm_teile(inhalt)
+                    quellen.add((typ, quelle))
+
+        for typ, quelle in sorted(quellen):
+            if cache_path(cache_key(typ, "svg", quelle)).exists():
+                vorhanden += 1
+                continue
+            try:
+                get_diagram(typ, "svg", quelle)
+                gerendert += 1
+            except KrokiError as e:
+                fehler += 1
+                self.stderr.write(self.style.ERROR(f"{typ}: {e}"))
+
+        entfernt = prune()
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(quellen)} Diagramme: {gerendert} gerendert, {vorhanden} bereits im Cache, "
+            f"{fehler} fehlgeschlagen, {entfernt} aus dem Cache entfernt"
+        ))
@@ -0,0 +1,193 @@
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+import asyncio
+import os
+import tempfile
+import threading
+import time
+
+from django.test import SimpleTestCase, override_settings
+
+from . import utils
+from .asgi import DiagrammApp
+
+QUELLE = "eNpLyUwvSizIUHBXqFYoSCwqTi1SyM0vSq0FAEdqBu4"
+
+
+class KrokiTestCase(SimpleTestCase):
+    """Cache in a temporary directory, Kroki replaced by a mocked pool, a fresh circuit breaker."""
+
+    def setUp(self):
+        verzeichnis = tempfile.TemporaryDirectory()
+        self.addCleanup(verzeichnis.cleanup)
+        self.verzeichnis = Path(verzeichnis.name)
+        einstellungen = override_settings(DIAGRAMM_CACHE_DIR=self.verzeichnis, DIAGRAMM_CACHE_MAX_BYTES=10 ** 6)
+        einstellungen.enable()
+        self.addCleanup(einstellungen.disable)
+
+        self.pool = mock.Mock()
+        self.pool.request.return_value = SimpleNamespace(status=200, data=b"<svg/>")
+        for name, wert in (("_pool", self.pool), ("breaker", utils.CircuitBreaker(3, 30))):
+            patcher = mock.patch.object(utils, name, wert)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class DiagrammCacheTest(KrokiTestCase):
+    def test_hit_and_miss(self):
+        key, daten = utils.get_diagram("plantuml", "svg", QUELLE)
+        self.assertEqual(daten, b"<svg/>")
+        self.assertEqual(utils.cache_path(key).read_bytes(), b"<svg/>")
+        self.assertEqual(utils.get_diagram("plantuml", "svg", QUELLE), (key, b"<svg/>"))
+        self.assertEqual(self.pool.request.call_count, 1)
+        utils.get_diagram("plantuml", "png", QUELLE)
+        self.assertEqual(self.pool.request.call_count, 2)
+
+    def test_concurrent_misses_render_once(self):
+        gestartet = threading.Event()
+        weiter = threading.Event()
+
+        def request(*args, **kwargs):
+            gestartet.set()
+            weiter.wait(5)
+            return SimpleNamespace(status=200, data=b"<svg/>")
+
+        self.pool.request.side_effect = request
+        ergebnisse = []
+        threads = [threading.Thread(target=lambda: ergebnisse.append(utils.get_diagram("plantuml", "svg", QUELLE)))
+                   for _ in range(2)]
+        threads[0].start()
+        self.assertTrue(gestartet.wait(5))
+        # the second miss waits for the lock held by the first render
+        threads[1].start()
+        time.sleep(0.2)
+        weiter.set()
+        for t in threads:
+            t.join(5)
+        self.assertEqual([daten for _, daten in ergebnisse], [b"<svg/>", b"<svg/>"])
+        self.assertEqual(self.pool.request.call_count, 1)
+
+    def test_prune_removes_least_recently_used(self):
+        pfade = []
+        for i in range(3):
+            pfad = utils.cache_path(utils.cache_key("plantuml", "svg", str(i)))
+            pfad.parent.mkdir(parents=True, exist_ok=True)
+            pfad.write_bytes(b"x" * 10)
+            os.utime(pfad, (1000 + i, 1000 + i))
+            pfade.append(pfad)
+        pfade[0].with_name(pfade[0].name + ".lock").write_bytes(b"x" * 100)
+
+        self.assertEqual(utils.prune(max_bytes=30), 0)
+        self.assertEqual(utils.prune(max_bytes=25), 1)
+        self.assertEqual([p.exists() for p in pfade], [False, True, True])
+
+
+class CircuitBreakerTest(KrokiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.jetzt = 1000.0
+        patcher = mock.patch.object(utils.time, "monotonic", lambda: self.jetzt)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pool.request.return_value = SimpleNamespace(status=503, data=b"")
+
+    def fetch(self):
+        return utils.fetch("plantuml", "svg", QUELLE)
+
+    def test_opens_after_consecutive_failures(self):
+        for _ in range(3):
+            with self.assertRaisesMessage(utils.KrokiError, "503"):
+                self.fetch()
+        with self.assertRaisesMessage(utils.KrokiError, "Kroki unavailable"):
+            self.fetch()
+        self.assertEqual(self.pool.request.call_count, 3)
+
+    def test_invalid_diagrams_do_not_count(self):
+        self.pool.request.return_value = SimpleNamespace(status=400, data=b"")
+        for _ in range(5):
+            with self.assertRaisesMessage(utils.KrokiError, "400"):
+                self.fetch()
+        self.assertEqual(self.pool.request.call_count, 5)
+
+    def test_half_open_retry(self):
+        for _ in range(3):
+            with self.assertRaises(utils.KrokiError):
+                self.fetch()
+
+        # after the pause one request goes through; failing, it opens the breaker again
+        self.jetzt += 31
+        with self.assertRaisesMessage(utils.KrokiError, "503"):
+            self.fetch()
+        with self.assertRaisesMessage(utils.KrokiError, "Kroki unavailable"):
+            self.fetch()
+        self.assertEqual(self.pool.request.call_count, 4)
+
+        # succeeding, it closes it
+        self.jetzt += 31
+        self.pool.request.return_value = SimpleNamespace(status=200, data=b"<svg/>")
+        self.assertEqual(self.fetch(), b"<svg/>")
+        self.pool.request.return_value = SimpleNamespace(status=503, data=b"")
+        with self.assertRaisesMessage(utils.KrokiError, "503"):
+            self.fetch()
+        with self.assertRaisesMessage(utils.KrokiError, "503"):
+            self.fetch()
+        self.assertEqual(self.pool.request.call_count, 7)
+
+
+class DiagrammAppTest(KrokiTestCase):
+    """The ASGI front answers diagram requests itself and passes everything else to Django."""
+
+    def setUp(self):
+        super().setUp()
+        self.django_app = mock.AsyncMock()
+        self.app = DiagrammApp(self.django_app)
+        self.etag = '"%s"' % utils.cache_key("plantuml", "svg", QUELLE)
+
+    async def anfrage(self, method="GET", path="/diagramm/plantuml/svg/" + QUELLE, headers=()):
+        gesendet = []
+
+        async def send(nachricht):
+            gesendet.append(nachricht)
+
+        scope = {"type": "http", "method": method, "path": path, "headers": list(headers)}
+        await self.app(scope, mock.AsyncMock(), send)
+        if not gesendet:
+            return None
+        start, body = gesendet
+        return start["status"], dict(start["headers"]), body["body"]
+
+    def test_get_and_head(self):
+        status, headers, body = asyncio.run(self.anfrage())
+        self.assertEqual((status, body), (200, b"<svg/>"))
+        self.assertEqual(headers[b"content-type"], b"image/svg+xml")
+        self.assertEqual(headers[b"etag"], self.etag.encode())
+
+        status, headers, body = asyncio.run(self.anfrage("HEAD"))
+        self.assertEqual((status, body), (200, b""))
+        self.assertEqual(headers[b"content-length"], b"6")
+        self.assertEqual(self.pool.request.call_count, 1)
+
+    def test_not_modified(self):
+        status, headers, body = asyncio.run(self.anfrage(headers=[(b"if-none-match", self.etag.encode())]))
+        self.assertEqual((status, body), (304, b""))
+        self.assertNotIn(b"content-length", headers)
+        self.pool.request.assert_not_called()
+
+    def test_kroki_error(self):
+        with mock.patch.object(utils, "fetch", side_effect=utils.KrokiError("Kroki answered 503 for plantuml/svg")):
+            status, headers, body = asyncio.run(self.anfrage())
+        self.assertEqual((status, body), (502, b"Kroki answered 503 for plantuml/svg"))
+        self.assertEqual(headers[b"cache-control"], b"no-store")
+
+    def test_concurrent_requests_share_one_render(self):
+        async def zwei():
+            return await asyncio.gather(self.anfrage(), self.anfrage())
+
+        self.assertEqual([body for _, _, body in asyncio.run(zwei())], [b"<svg/>", b"<svg/>"])
+        self.assertEqual(self.pool.request.call_count, 1)
+
+    def test_other_requests_go_to_django(self):
+        self.assertIsNone(asyncio.run(self.anfrage(path="/standards/")))
+        self.assertIsNone(asyncio.run(self.anfrage("POST")))
+        self.assertEqual(self.django_app.await_count, 2)
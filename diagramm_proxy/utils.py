@@ -0,0 +1,161 @@
+"""
+On-disk cache for diagrams rendered by Kroki.
+
+Diagram URLs contain the diagram type and the compressed source, so a
+rendering never changes for a given URL. Renderings are stored under the
+SHA-256 of "<type>/<format>/<source>" in settings.DIAGRAMM_CACHE_DIR, shared
+by all workers on the data volume. Hits refresh the file's mtime; when the
+cache grows beyond settings.DIAGRAMM_CACHE_MAX_BYTES the least recently used
+files are removed. Concurrent misses for the same diagram are coalesced with
+a file lock, so Kroki renders each diagram once.
+
+After KROKI_FEHLER_MAX consecutive failures Kroki is not asked again for
+KROKI_PAUSE seconds; misses fail immediately instead of waiting for timeouts.
+"""
+import fcntl
+import hashlib
+import os
+import threading
+import time
+from pathlib import Path
+
+import urllib3
+from django.conf import settings
+
+# Hits refresh the mtime at most this often, to keep reads cheap.
+TOUCH_INTERVALL = 3600
+KROKI_TIMEOUT = urllib3.Timeout(connect=2.0, read=20.0)
+KROKI_FEHLER_MAX = 5
+KROKI_PAUSE = 30
+
+# keep-alive connections to Kroki, one per concurrent render
+_pool = urllib3.PoolManager(maxsize=settings.KROKI_MAX_PARALLEL, block=True, retries=False)
+
+
+class KrokiError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """Counts consecutive failures and stays open for `pause` seconds after `max_fehler` of them."""
+
+    def __init__(self, max_fehler, pause):
+        self.max_fehler = max_fehler
+        self.pause = pause
+        self.fehler = 0
+        self.offen_bis = 0.0
+        self._lock = threading.Lock()
+
+    def check(self):
+        rest = self.offen_bis - time.monotonic()
+        if rest > 0:
+            raise KrokiError(f"Kroki unavailable, retrying in {rest:.0f}s")
+
+    def success(self):
+        with self._lock:
+            self.fehler = 0
+
+    def failure(self):
+        with self._lock:
+            self.fehler += 1
+            if self.fehler >= self.max_fehler:
+                # after the pause, a single further failure opens it again
+                self.offen_bis = time.monotonic() + self.pause
+
+
+breaker = CircuitBreaker(KROKI_FEHLER_MAX, KROKI_PAUSE)
+
+
+def cache_dir():
+    return Path(settings.DIAGRAMM_CACHE_DIR)
+
+
+def cache_key(typ, fmt, quelle):
+    return hashlib.sha256(f"{typ}/{fmt}/{quelle}".encode("utf-8")).hexdigest()
+
+
+def cache_path(key):
+    return cache_dir() / key[:2] / key
+
+
+def _read(pfad):
+    try:
+        daten = pfad.read_bytes()
+    except FileNotFoundError:
+        return None
+    jetzt = time.time()
+    try:
+        if jetzt - pfad.stat().st_mtime > TOUCH_INTERVALL:
+            os.utime(pfad, (jetzt, jetzt))
+    except OSError:
+        pass
+    return daten
+
+
+def fetch(typ, fmt, quelle):
+    """Renders a diagram with Kroki. Raises KrokiError if that fails."""
+    breaker.check()
+    url = settings.KROKI_URL.rstrip("/") + f"/{typ}/{fmt}/{quelle}"
+    try:
+        response = _pool.request("GET", url, timeout=KROKI_TIMEOUT)
+    except urllib3.exceptions.HTTPError as e:
+        breaker.failure()
+        raise KrokiError(str(e))
+    if response.status >= 500:
+        breaker.failure()
+    else:
+        # a 4xx is an invalid diagram, Kroki itself is fine
+        breaker.success()
+    if response.status != 200:
+        raise KrokiError(f"Kroki answered {response.status} for {typ}/{fmt}")
+    return response.data
+
+
+def get_diagram(typ, fmt, quelle):
+    """Returns (key, rendering) from the cache, asking Kroki on a miss."""
+    key = cache_key(typ, fmt, quelle)
+    pfad = cache_path(key)
+    daten = _read(pfad)
+    if daten is not None:
+        return key, daten
+
+    pfad.parent.mkdir(parents=True, exist_ok=True)
+    with open(pfad.with_name(key + ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            # another worker may have rendered it while we waited
+            daten = _read(pfad)
+            if daten is None:
+                daten = fetch(typ, fmt, quelle)
+                tmp = pfad.with_name(f".{key}.{os.getpid()}.tmp")
+                tmp.write_bytes(daten)
+                os.replace(tmp, pfad)
+                prune()
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    return key, daten
+
+
+def prune(max_bytes=None):
+    """Removes least recently used renderings until the cache fits. Returns the number removed."""
+    max_bytes = settings.DIAGRAMM_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    dateien = []
+    gesamt = 0
+    for unterordner in cache_dir().glob("??"):
+        for eintrag in os.scandir(unterordner):
+            if eintrag.name.endswith((".lock", ".tmp")):
+                continue
+            stat = eintrag.stat()
+            dateien.append((stat.st_mtime, stat.st_size, eintrag.path))
+            gesamt += stat.st_size
+    entfernt = 0
+    for _, groesse, pfad in sorted(dateien):
+        if gesamt <= max_bytes:
+            break
+        try:
+            os.remove(pfad)
+        except FileNotFoundError:
+            pass
+        gesamt -= groesse
+        entfernt += 1
+    return entfernt
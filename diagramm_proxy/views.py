@@ -1,4 +1,47 @@
+import re
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import quote_etag
 from revproxy.views import ProxyView
 
+from .utils import KrokiError, cache_key, get_diagram
+
+# /diagramm/<type>/<format>/<deflated, base64 encoded source>
+DIAGRAMM_PFAD = re.compile(r"^(?P<typ>[a-z0-9]+)/(?P<fmt>svg|png|jpeg|pdf)/(?P<quelle>[A-Za-z0-9_=-]+)$")
+CONTENT_TYPES = {
+    "svg": "image/svg+xml",
+    "png": "image/png",
+    "jpeg": "image/jpeg",
+    "pdf": "application/pdf",
+}
+
+
 class DiagrammProxyView(ProxyView):
-    upstream = "http://svckroki:8000/"
+    upstream = settings.KROKI_URL
+
+
+def diagramm(request, path):
+    """
+    Serves a diagram from the local cache (see diagramm_proxy.utils). The URL
+    determines the rendering, so responses may be cached forever. Requests
+    the cache does not handle are passed through to Kroki.
+    """
+    m = DIAGRAMM_PFAD.match(path)
+    if request.method not in ("GET", "HEAD") or not m:
+        return DiagrammProxyView.as_view()(request, path=path)
+
+    etag = quote_etag(cache_key(m["typ"], m["fmt"], m["quelle"]))
+    if etag in request.headers.get("If-None-Match", ""):
+        response = HttpResponseNotModified()
+    else:
+        try:
+            _, daten = get_diagram(m["typ"], m["fmt"], m["quelle"])
+        except KrokiError as e:
+            response = HttpResponse(str(e), status=502, content_type="text/plain")
+            response["Cache-Control"] = "no-store"
+            return response
+        response = HttpResponse(daten, content_type=CONTENT_TYPES[m["fmt"]])
+    response["ETag"] = etag
+    response["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
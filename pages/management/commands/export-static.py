@@ -0,0 +1,139 @@
+# pages/management/commands/export-static.py
+import datetime
+import gzip
+import json
+import os
+import time
+from pathlib import Path
+from urllib.parse import unquote
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, Max, Q
+from django.test import Client
+from django.urls import NoReverseMatch, reverse
+
+from referenzen.models import Referenz
+from rollen.models import Rolle
+from standards.models import Inhaltsversion, Standard, Vorgabe
+from standards.snapshots import boundaries, snapshot_date
+from standards.utils import standard_key
+from stichworte.models import Stichwort
+
+try:
+    import brotli
+except ImportError:  # optional, only gzip siblings are written without it
+    brotli = None
+
+MANIFEST = ".manifest.json"
+
+
+class Command(BaseCommand):
+    help = (
+        "Render the portal into a static directory tree (<path>/index.html) with .gz and, if the "
+        "brotli module is installed, .br siblings.\n"
+        "Pages are only rendered again when their content version changed since the last export; "
+        "use --all after template changes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("ziel", help="Target directory")
+        parser.add_argument("--all", action="store_true", help="Render all pages regardless of their fingerprint")
+        parser.add_argument("--host", default="localhost", help="Host header used for rendering (must be in ALLOWED_HOSTS)")
+
+    def pages(self):
+        """Yields (url, fingerprint); a page is rendered again when its fingerprint changes."""
+        heute = datetime.date.today()
+        # Lists and the Stichwort/Rolle/Referenz pages depend on many standards:
+        # any content version, the number of standards and the validity
+        # boundary in effect today.
+        versionen = Inhaltsversion.objects.aggregate(max=Max("geaendert"), anzahl=Count("pk"))
+        grenzen = Vorgabe.objects.aggregate(
+            von=Max("gueltigkeit_von", filter=Q(gueltigkeit_von__lte=heute)),
+            bis=Max("gueltigkeit_bis", filter=Q(gueltigkeit_bis__lte=heute)),
+        )
+        stichtag = max((d for d in grenzen.values() if d), default=None)
+        global_fp = f"{versionen['max']}|{versionen['anzahl']}|{stichtag}"
+
+        yield "/", global_fp
+        yield "/search/", global_fp
+        yield reverse("standard_list"), global_fp
+        yield reverse("stichworte_list"), global_fp
+        for stichwort in Stichwort.objects.values_list("stichwort", flat=True):
+            try:
+                yield reverse("stichwort_detail", kwargs={"stichwort": stichwort}), global_fp
+            except NoReverseMatch:
+                self.stdout.write(self.style.WARNING(f"Stichwort {stichwort!r} has no URL, skipped"))
+        yield reverse("rolle_list"), global_fp
+        for rolle in Rolle.objects.values_list("name", flat=True):
+            yield reverse("rolle_detail", kwargs={"rolle": rolle}), global_fp
+        yield reverse("referenz_tree"), global_fp
+        for refid in Referenz.objects.values_list("id", flat=True):
+            yield reverse("referenz_detail", kwargs={"refid": refid}), global_fp
+
+        versionen = dict(Inhaltsversion.objects.values_list("schluessel", "geaendert"))
+        for standard in Standard.objects.all():
+            version = versionen.get(standard_key(standard.nummer))
+            # pages as of today change at validity boundaries, too
+            heute_fp = f"{version}|{snapshot_date(standard, heute)}"
+            yield reverse("standard_detail", kwargs={"nummer": standard.nummer}), heute_fp
+            yield reverse("standard_history", kwargs={"nummer": standard.nummer}), heute_fp
+            yield reverse("standard_checkliste", kwargs={"nummer": standard.nummer}), str(version)
+            for grenze in boundaries(standard):
+                yield reverse("standard_history", kwargs={"nummer": standard.nummer}) + grenze.isoformat() + "/", str(version)
+
+    def write(self, pfad, inhalt):
+        pfad.parent.mkdir(parents=True, exist_ok=True)
+        varianten = [(pfad, inhalt), (pfad.with_name(pfad.name + ".gz"), gzip.compress(inhalt, 9, mtime=0))]
+        if brotli:
+            varianten.append((pfad.with_name(pfad.name + ".br"), brotli.compress(inhalt)))
+        for ziel, daten in varianten:
+            tmp = ziel.with_name(f".{ziel.name}.tmp")
+            tmp.write_bytes(daten)
+            os.replace(tmp, ziel)
+
+    def remove(self, pfad):
+        for endung in ("", ".gz", ".br"):
+            pfad.with_name(pfad.name + endung).unlink(missing_ok=True)
+
+    def handle(self, *args, **options):
+        ziel = Path(options["ziel"])
+        ziel.mkdir(parents=True, exist_ok=True)
+        manifest_pfad = ziel / MANIFEST
+        manifest = {}
+        # read with --all, too: it lists the pages to remove when they are gone
+        if manifest_pfad.exists():
+            manifest = json.loads(manifest_pfad.read_text(encoding="utf-8"))
+
+        # REMOTE_ADDR outside INTERNAL_IPS keeps the debug toolbar out of the pages
+        client = Client(HTTP_HOST=options["host"], REMOTE_ADDR="192.0.2.1", raise_request_exception=False)
+        start = time.monotonic()
+        neu, gerendert, fehler, seiten = {}, 0, [], set()
+        for url, fingerprint in self.pages():
+            seiten.add(url)
+            pfad = ziel / unquote(url).lstrip("/") / "index.html"
+            if not options["all"] and manifest.get(url) == fingerprint and pfad.exists():
+                neu[url] = fingerprint
+                continue
+            response = client.get(url)
+            if response.status_code != 200:
+                # an older rendering stays in place and is retried next time
+                fehler.append(url)
+                self.stderr.write(self.style.ERROR(f"{url}: HTTP {response.status_code}"))
+                continue
+            self.write(pfad, response.content)
+            neu[url] = fingerprint
+            gerendert += 1
+
+        entfernt = 0
+        for url in set(manifest) - seiten:
+            self.remove(ziel / unquote(url).lstrip("/") / "index.html")
+            entfernt += 1
+
+        manifest_pfad.write_text(json.dumps(neu, indent=0, sort_keys=True), encoding="utf-8")
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {len(neu)} pages to {ziel}: {gerendert} rendered, {len(neu) - gerendert} unchanged, "
+            f"{entfernt} removed in {time.monotonic() - start:.2f}s"
+            + ("" if brotli else " (brotli not installed, gzip only)")
+        ))
+        if fehler:
+            raise CommandError(f"{len(fehler)} pages failed: {', '.join(fehler)}")
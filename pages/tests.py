@@ -0,0 +1,135 @@
+from io import StringIO
+from pathlib import Path
+from urllib.parse import unquote
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from standards import suchindex
+from standards.models import VorgabeKurztext
+from standards.tests import InhaltTestCase
+from stichworte.models import Stichwort
+
+
+class SucheTest(InhaltTestCase):
+    """The search index follows edits through the signals and is read page by page."""
+
+    def suche(self, q, **params):
+        return self.client.get("/search/api/", {"q": q, "suchbereich[]": ["kurztext", "titel"], **params}).json()
+
+    def test_vorgabe_is_indexed_and_removed(self):
+        standard = self.make_standard("KLEIN", 1)
+        vorgabe = standard.vorgaben.get()
+        VorgabeKurztext.objects.create(abschnitt=vorgabe, abschnitttyp=self.text, inhalt="Container härten")
+
+        treffer = self.suche("harte")["treffer"]
+        self.assertEqual([(t["bereich"], t["vorgabe"]) for t in treffer], [("Kurztext", vorgabe.Vorgabennummer())])
+        self.assertIn("<mark>härten</mark>", treffer[0]["snippet"])
+        self.assertEqual([t["titel"] for t in self.suche("Vorgabe")["treffer"]], ["Vorgabe 0"])
+
+        vorgabe.delete()
+        self.assertEqual(self.suche("harte")["treffer"], [])
+        self.assertEqual(self.suche("Vorgabe")["treffer"], [])
+
+    def test_einleitung(self):
+        self.make_standard("KLEIN", 0)
+        treffer = self.suche("Einleitung", **{"suchbereich[]": ["einleitung"]})["treffer"]
+        self.assertEqual([(t["bereich"], t["standard"], t["vorgabe"]) for t in treffer], [("Einleitung", "KLEIN", None)])
+        self.assertEqual(self.suche("Einleitung")["treffer"], [])
+        self.assertContains(self.client.get("/search/"), 'value="einleitung"')
+
+    def test_second_page(self):
+        self.make_standard("GROSS", 3)
+        erste = self.suche("Kurz", limit=2)
+        self.assertEqual(len(erste["treffer"]), 2)
+        self.assertEqual(erste["next_offset"], 2)
+        zweite = self.suche("Kurz", limit=2, offset=2)
+        self.assertEqual(len(zweite["treffer"]), 1)
+        self.assertIsNone(zweite["next_offset"])
+        self.assertEqual(zweite["previous_offset"], 0)
+        vorgaben = {t["vorgabe"] for t in erste["treffer"] + zweite["treffer"]}
+        self.assertEqual(len(vorgaben), 3)
+
+        response = self.client.get("/search/", {"q": "Kurz", "limit": 2, "offset": 2})
+        self.assertContains(response, "« Vorherige")
+        self.assertNotContains(response, "Weitere Resultate")
+
+    def test_stale_rows_are_left_out(self):
+        self.make_standard("KLEIN", 1)
+        with connection.cursor() as cursor:
+            suchindex._insert(cursor, [("Kurz verwaist", "kurztext", 9999, 9999, 9999)])
+        self.assertEqual(len(self.suche("Kurz")["treffer"]), 1)
+        response = self.client.get("/search/", {"q": "Kurz"})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "verwaist")
+
+
+class HealthTest(TestCase):
+    databases = "__all__"
+
+    @override_settings(PUBLISHED_DB="/nonexistent/published.sqlite3")
+    def test_nothing_published_yet(self):
+        response = self.client.get("/health/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["databases"], {"default": "ok", "readonly": "not published"})
+
+    @override_settings(PUBLISHED_DB=None)
+    def test_all_databases_answer(self):
+        response = self.client.get("/health/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"status": "ok", "databases": {"default": "ok", "readonly": "ok"}})
+
+
+
+class ExportStaticTest(InhaltTestCase):
+    """export-static renders only pages whose fingerprint changed and removes pages that are gone."""
+
+    def setUp(self):
+        verzeichnis = tempfile.TemporaryDirectory()
+        self.addCleanup(verzeichnis.cleanup)
+        self.ziel = Path(verzeichnis.name)
+        self.klein = self.make_standard("KLEIN", 1)
+        self.make_standard("GROSS", 1)
+
+    def export(self, *args):
+        out = StringIO()
+        call_command("export-static", str(self.ziel), *args, stdout=out)
+        return out.getvalue()
+
+    def seite(self, name, **kwargs):
+        return self.ziel / unquote(reverse(name, kwargs=kwargs)).lstrip("/") / "index.html"
+
+    def assertInDatei(self, pfad, text):
+        self.assertIn(text, pfad.read_text(encoding="utf-8"))
+
+    def test_incremental(self):
+        self.assertIn(" 0 unchanged, 0 removed", self.export())
+        gross = self.seite("standard_detail", nummer="GROSS")
+        klein = self.seite("standard_detail", nummer="KLEIN")
+        self.assertInDatei(klein, "Vorgabe 0")
+        self.assertIn(": 0 rendered,", self.export())
+
+        os.utime(gross, ns=(0, 0))
+        vorgabe = self.klein.vorgaben.get()
+        vorgabe.titel = "Geändert"
+        vorgabe.save()
+        self.assertNotIn(": 0 rendered,", self.export())
+        self.assertInDatei(klein, "Geändert")
+        self.assertEqual(gross.stat().st_mtime_ns, 0)
+        self.assertTrue(gross.with_name("index.html.gz").exists())
+
+    def test_removed_page(self):
+        Stichwort.objects.create(stichwort="Veraltet")
+        self.export()
+        seite = self.seite("stichwort_detail", stichwort="Veraltet")
+        self.assertTrue(seite.exists())
+
+        Stichwort.objects.filter(stichwort="Veraltet").delete()
+        self.assertIn(" 1 removed", self.export("--all"))
+        self.assertFalse(seite.exists())
+        self.assertFalse(seite.with_name("index.html.gz").exists())
+        self.assertTrue(self.seite("stichwort_detail", stichwort="Container").exists())
@@ -1,34 +1,129 @@
+from django.db import DatabaseError, connections
+from django.http import JsonResponse
 from django.shortcuts import render
-from abschnitte.utils import render_textabschnitte
-from standards.models import Standard, VorgabeLangtext, VorgabeKurztext, Geltungsbereich
-from itertools import groupby
-import datetime
+from django.urls import reverse
+from VorgabenUI.db import READONLY_DB_ALIAS, readonly_available
+from standards.models import Standard, Vorgabe
+from standards import suchindex
+
+SUCHBEREICHE = {
+    "titel": "Titel",
+    "kurztext": "Kurztext",
+    "langtext": "Langtext",
+    "einleitung": "Einleitung",
+    "geltungsbereich": "Geltungsbereich",
+    "stichworte": "Stichworte",
+    "referenzen": "Referenzen",
+}
+STANDARD_SUCHBEREICHE = ["titel", "kurztext", "langtext"]
+SEITENGROESSE = 50
+MAX_SEITENGROESSE = 200
 
 def startseite(request):
     standards=list(Standard.objects.all())
     return render(request, 'startseite.html', {"standards":standards,})
 
+def _zahl(value, default):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+def _suche(params):
+    """
+    Runs one page of a search given the request parameters q, suchbereich[],
+    limit and offset. Only the requested page (plus one row to see whether
+    there is more) is read from the index.
+    """
+    suchbegriff = params.get("q", "")
+    areas = [a for a in params.getlist("suchbereich[]") if a in SUCHBEREICHE] or STANDARD_SUCHBEREICHE
+    limit = min(max(_zahl(params.get("limit"), SEITENGROESSE), 1), MAX_SEITENGROESSE)
+    offset = max(_zahl(params.get("offset"), 0), 0)
+
+    treffer = suchindex.search(suchbegriff, areas, limit=limit + 1, offset=offset)
+    weitere = len(treffer) > limit
+    treffer = treffer[:limit]
+
+    vorgaben = Vorgabe.objects.select_related("dokument", "thema").in_bulk({t.vorgabe_id for t in treffer if t.vorgabe_id})
+    standards = Standard.objects.in_bulk({t.standard_id for t in treffer})
+    # rows the index still holds for deleted objects are left out
+    resultat = [
+        {
+            "bereich": SUCHBEREICHE[t.bereich],
+            "standard": standards[t.standard_id],
+            "vorgabe": vorgaben.get(t.vorgabe_id),
+            "snippet": t.snippet,
+        }
+        for t in treffer
+        if t.standard_id in standards and (t.vorgabe_id is None or t.vorgabe_id in vorgaben)
+    ]
+    return {
+        "suchbegriff": suchbegriff,
+        "suchbereiche": areas,
+        "limit": limit,
+        "offset": offset,
+        "next_offset": offset + limit if weitere else None,
+        "previous_offset": max(offset - limit, 0) if offset else None,
+        "treffer": resultat,
+    }
+
 def search(request):
-    if request.method == "GET":
-        return render(request, 'search.html')
-    elif request.method == "POST":
-        suchbegriff=request.POST.get("q")
-        areas=request.POST.getlist("suchbereich[]")
-        result= {}
-        geltungsbereich=set()
-        if "kurztext" in areas:
-            qs = VorgabeKurztext.objects.filter(inhalt__contains=suchbegriff).exclude(abschnitt__gueltigkeit_bis__lt=datetime.date.today())
-            result["kurztext"] = {k: [o.abschnitt for o in g] for k, g in groupby(qs, key=lambda o: o.abschnitt.dokument)}
-        if "langtext" in areas:
-            qs = VorgabeLangtext.objects.filter(inhalt__contains=suchbegriff).exclude(abschnitt__gueltigkeit_bis__lt=datetime.date.today())
-            result['langtext']=  {k: [o.abschnitt for o in g] for k, g in groupby(qs, key=lambda o: o.abschnitt.dokument)}
-        if "geltungsbereich" in areas:
-            result["geltungsbereich"]={}
-            geltungsbereich=set(list([x.geltungsbereich for x in Geltungsbereich.objects.filter(inhalt__contains=suchbegriff)]))
-        for s in geltungsbereich:
-            result["geltungsbereich"][s]=render_textabschnitte(s.geltungsbereich_set.order_by("order"))
-        for r in result.keys():
-            for s in result[r].keys():
-                result[r][s]=set(result[r][s])
-        return render(request,"results.html",{"suchbegriff":suchbegriff,"resultat":result})
+    params = request.POST if request.method == "POST" else request.GET
+    if not params.get("q"):
+        return render(request, 'search.html', {"suchbereiche": SUCHBEREICHE, "aktiv": STANDARD_SUCHBEREICHE})
+
+    suche = _suche(params)
+    # group the page by Standard, keeping the order of each Standard's best hit
+    resultat = {}
+    for t in suche["treffer"]:
+        resultat.setdefault(t["standard"], []).append(t)
+
+    seite = params.copy()
+    seite.pop("csrfmiddlewaretoken", None)
+    links = {}
+    for name in ("next_offset", "previous_offset"):
+        if suche[name] is not None:
+            seite["offset"] = suche[name]
+            links[name] = "?" + seite.urlencode()
+    return render(request, "results.html", {
+        "suchbegriff": suche["suchbegriff"],
+        "resultat": resultat,
+        "links": links,
+        "offset": suche["offset"],
+    })
+
+def search_api(request):
+    suche = _suche(request.GET)
+    suche["treffer"] = [
+        {
+            "bereich": t["bereich"],
+            "standard": t["standard"].nummer,
+            "vorgabe": t["vorgabe"].Vorgabennummer() if t["vorgabe"] else None,
+            "titel": t["vorgabe"].titel if t["vorgabe"] else None,
+            "url": reverse("standard_detail", kwargs={"nummer": t["standard"].nummer})
+                   + ("#" + t["vorgabe"].Vorgabennummer() if t["vorgabe"] else ""),
+            "snippet": t["snippet"],
+        }
+        for t in suche["treffer"]
+    ]
+    return JsonResponse(suche)
 
+def health(request):
+    """
+    Probe for Kubernetes: every database alias must answer a query. Before
+    the first publish the portal reads the live database, so a missing
+    published copy is reported but not an error.
+    """
+    datenbanken = {}
+    for alias in connections:
+        if alias == READONLY_DB_ALIAS and not readonly_available():
+            datenbanken[alias] = "not published"
+            continue
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute("SELECT 1")
+            datenbanken[alias] = "ok"
+        except DatabaseError as e:
+            datenbanken[alias] = str(e)
+    ok = all(status in ("ok", "not published") for status in datenbanken.values())
+    return JsonResponse({"status": "ok" if ok else "error", "databases": datenbanken}, status=200 if ok else 503)
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:37
+
+from django.db import migrations, models
+
+
+def fill_pfade(apps, schema_editor):
+    # same result as Referenz.Path(), computed from the lft/rght intervals
+    Referenz = apps.get_model('referenzen', 'Referenz')
+    knoten = list(Referenz.objects.order_by('tree_id', 'lft'))
+    ancestors = []
+    for k in knoten:
+        while ancestors and (ancestors[-1].tree_id != k.tree_id or ancestors[-1].rght < k.lft):
+            ancestors.pop()
+        ancestors.append(k)
+        k.pfad = " → ".join(a.name_nummer for a in ancestors) + (" (%s)" % k.name_text if k.name_text else "")
+    Referenz.objects.bulk_update(knoten, ['pfad'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('referenzen', '0003_referenzerklaerung_html'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='referenz',
+            name='pfad',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(fill_pfade, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import receiver
 from mptt.models import MPTTModel, TreeForeignKey
 from abschnitte.models import Textabschnitt
 
@@ -11,11 +13,40 @@ class Referenz(MPTTModel):
         'self', null=True, blank=True, on_delete=models.SET_NULL, related_name='unterreferenzen'
     )
     url = models.URLField(blank=True)
+    # Path() as of the last save or move, kept by referenzen.utils.update_pfade
+    pfad = models.TextField(blank=True, default='', editable=False)
 
-    def Path(self):
-        Temp = " → ".join([str(x) for x in self.get_ancestors(include_self=True)])+(" (%s)"%self.name_text if self.name_text else "")
+    def Path(self, ancestors=None):
+        """
+        Returns the full path of this reference. ancestors (including self, root
+        first) may be passed in if already loaded, otherwise the stored pfad is
+        used or, if there is none, they are queried.
+        """
+        if ancestors is None:
+            if self.pfad:
+                return self.pfad
+            ancestors = self.get_ancestors(include_self=True)
+        Temp = " → ".join([str(x) for x in ancestors])+(" (%s)"%self.name_text if self.name_text else "")
         return Temp
 
+    def _pfad_felder(self):
+        return tuple(self.__dict__.get(f) for f in ("name_nummer", "name_text", "oberreferenz_id"))
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._pfad_stand = instance._pfad_felder()
+        return instance
+
+    def save(self, *args, **kwargs):
+        from .utils import update_pfade
+        geaendert = self._state.adding or self._pfad_felder() != getattr(self, "_pfad_stand", None)
+        super().save(*args, **kwargs)
+        # renaming or moving (move_to saves, too) changes the path of the whole subtree
+        if geaendert:
+            update_pfade(self)
+        self._pfad_stand = self._pfad_felder()
+
     class MPTTMeta:
         parent_attr = 'oberreferenz'  # optional, but safe
         order_insertion_by = ['name_nummer']
@@ -26,6 +57,15 @@ class Referenz(MPTTModel):
     class Meta:
         verbose_name_plural="Referenzen"
 
+@receiver(pre_delete, sender=Referenz)
+def merke_unterreferenzen(sender, instance, **kwargs):
+    instance._unterreferenzen = list(instance.unterreferenzen.values_list("pk", flat=True))
+
+@receiver(post_delete, sender=Referenz)
+def update_unterreferenzen(sender, instance, **kwargs):
+    from .utils import update_verwaiste_pfade
+    update_verwaiste_pfade(getattr(instance, "_unterreferenzen", []))
+
 class Referenzerklaerung (Textabschnitt):
     erklaerung = models.ForeignKey(Referenz,on_delete=models.CASCADE)
 
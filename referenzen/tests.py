@@ -1,3 +1,136 @@
+from unittest import mock
+
+from datetime import date
+
 from django.test import TestCase
+from django.utils.html import strip_tags
+
+from standards import suchindex
+from standards.models import Vorgabe
+from standards.tests import InhaltTestCase
+from . import utils
+from .models import Referenz
+
+
+class ReferenzPfadTest(TestCase):
+    """Stored paths follow renames, moves and deleted parents."""
+
+    def setUp(self):
+        self.wurzel = Referenz.objects.create(name_nummer="ISO 27001")
+        self.kapitel = Referenz.objects.create(name_nummer="A.8", oberreferenz=self.wurzel)
+        self.blatt = Referenz.objects.create(name_nummer="A.8.1", name_text="Endgeräte", oberreferenz=self.kapitel)
+        self.bsi = Referenz.objects.create(name_nummer="BSI")
+
+    # MPTT writes the tree fields of the instance back on save, so saves and
+    # moves use freshly loaded instances, as the admin does.
+    def frisch(self, referenz):
+        return Referenz.objects.get(pk=referenz.pk)
+
+    def pfad(self, referenz):
+        return self.frisch(referenz).pfad
+
+    def test_rename_updates_subtree(self):
+        self.assertEqual(self.pfad(self.blatt), "ISO 27001 → A.8 → A.8.1 (Endgeräte)")
+        kapitel = self.frisch(self.kapitel)
+        kapitel.name_nummer = "A.9"
+        kapitel.save()
+        self.assertEqual(self.pfad(self.kapitel), "ISO 27001 → A.9")
+        self.assertEqual(self.pfad(self.blatt), "ISO 27001 → A.9 → A.8.1 (Endgeräte)")
+
+    def test_move(self):
+        self.frisch(self.kapitel).move_to(self.frisch(self.bsi))
+        self.assertEqual(self.pfad(self.blatt), "BSI → A.8 → A.8.1 (Endgeräte)")
+        blatt = self.frisch(self.blatt)
+        blatt.oberreferenz = self.frisch(self.wurzel)
+        blatt.save()
+        self.assertEqual(self.pfad(blatt), "ISO 27001 → A.8.1 (Endgeräte)")
+
+    def test_save_loads_only_ancestors_and_subtree(self):
+        for i in range(30):
+            Referenz.objects.create(name_nummer="A.8.%d" % (i + 2), oberreferenz=self.frisch(self.kapitel))
+        geladen = []
+        original = utils.baum_pfade
+
+        def baum_pfade(knoten):
+            knoten = list(knoten)
+            geladen.extend(str(k) for k in knoten)
+            return original(knoten)
+
+        blatt = self.frisch(self.blatt)
+        with mock.patch("referenzen.utils.baum_pfade", baum_pfade):
+            blatt.url = "https://example.org"
+            blatt.save()
+            self.assertEqual(geladen, [])
+            blatt.name_text = "neu"
+            blatt.save()
+        self.assertEqual(geladen, ["ISO 27001", "A.8", "A.8.1"])
+        self.assertEqual(self.pfad(self.blatt), "ISO 27001 → A.8 → A.8.1 (neu)")
+
+    def test_paths_without_stored_path_are_loaded_in_chunks(self):
+        Referenz.objects.update(pfad="")
+        referenzen = list(Referenz.objects.order_by("pk"))
+        with mock.patch.object(utils, "VORFAHREN_CHUNK", 2), self.assertNumQueries(2):
+            pfade = utils.referenz_pfade(referenzen)
+        self.assertEqual(pfade, {
+            self.wurzel.pk: "ISO 27001",
+            self.kapitel.pk: "ISO 27001 → A.8",
+            self.blatt.pk: "ISO 27001 → A.8 → A.8.1 (Endgeräte)",
+            self.bsi.pk: "BSI",
+        })
+
+    def test_many_paths_without_stored_path(self):
+        # one OR term per reference in a single query exceeds SQLite's expression depth
+        Referenz.objects.bulk_create([
+            Referenz(name_nummer="R%d" % i, tree_id=1000 + i, lft=1, rght=2, level=0) for i in range(1200)
+        ])
+        referenzen = list(Referenz.objects.filter(name_nummer__startswith="R"))
+        pfade = utils.referenz_pfade(referenzen)
+        self.assertEqual(len(pfade), 1200)
+        self.assertEqual(pfade[referenzen[-1].pk], referenzen[-1].name_nummer)
+
+    def test_deleted_parent(self):
+        self.frisch(self.kapitel).delete()
+        self.assertEqual(self.pfad(self.blatt), "A.8.1 (Endgeräte)")
+        self.assertEqual(self.pfad(self.wurzel), "ISO 27001")
+
+
+class ReferenzSuchindexTest(InhaltTestCase):
+    def test_deleted_parent_updates_search_index(self):
+        self.make_standard("KLEIN", 1)
+
+        def referenzen():
+            return strip_tags(suchindex.search("A.8.0", ["referenzen"])[0].snippet)
+
+        self.assertIn("ISO 27001 → A.8 → A.8.0", referenzen())
+        Referenz.objects.get(pk=self.kapitel.pk).delete()
+        self.assertNotIn("→", referenzen())
+
+
+class ReferenzDetailTest(InhaltTestCase):
+    """The detail page lists the Vorgaben of the whole subtree with a constant number of queries."""
+
+    def setUp(self):
+        self.klein = self.make_standard("KLEIN", 2)
+        nur_wurzel = Vorgabe.objects.create(nummer=9, dokument=self.klein, thema=self.thema, titel="Nur Wurzel",
+                                            gueltigkeit_von=date(2020, 1, 1))
+        nur_wurzel.referenzen.add(self.wurzel)
+
+    def detail(self, referenz):
+        return self.client.get("/referenzen/%d/" % referenz.pk)
+
+    def test_subtree(self):
+        response = self.detail(self.kapitel)
+        self.assertContains(response, '<a href="../%d">' % self.wurzel.pk)
+        for nummer in ("KLEIN.T.0", "KLEIN.T.1"):
+            self.assertContains(response, 'href="/standards/KLEIN/#%s"' % nummer)
+        self.assertNotContains(response, "KLEIN.T.9")
+        self.assertContains(self.detail(self.wurzel), 'href="/standards/KLEIN/#KLEIN.T.9"')
 
-# Create your tests here.
+    def test_query_count_is_constant(self):
+        # the Referenz, its Erklaerungen, its subtree and the Vorgaben below it
+        with self.assertNumQueries(4):
+            self.detail(self.kapitel)
+        self.make_standard("GROSS", 10)
+        with self.assertNumQueries(4):
+            response = self.detail(self.kapitel)
+        self.assertContains(response, 'href="/standards/GROSS/#GROSS.T.9"')
@@ -0,0 +1,93 @@
+from itertools import groupby
+from operator import attrgetter
+
+from django.db.models import Q
+
+from .models import Referenz
+
+# References whose ancestors are loaded per query; each adds a term to an OR
+# and SQLite limits the depth of an expression tree to 1000.
+VORFAHREN_CHUNK = 200
+
+
+def baum_pfade(knoten):
+    """
+    Yields (referenz, path) for the nodes of one tree, given in lft order.
+    The ancestor chains come from the lft/rght intervals, without queries.
+    """
+    ancestors = []
+    for k in knoten:
+        while ancestors and ancestors[-1].rght < k.lft:
+            ancestors.pop()
+        ancestors.append(k)
+        yield k, k.Path(ancestors)
+
+
+def update_pfade(referenz):
+    """
+    Stores the path of referenz and of every node below it whose path
+    changed, e.g. after a rename or a move. Its ancestors and subtree are
+    loaded with one query.
+    """
+    knoten = (referenz.get_ancestors() | referenz.get_descendants(include_self=True)).order_by("lft")
+    geaendert = []
+    for k, pfad in baum_pfade(knoten):
+        if k.pk == referenz.pk:
+            referenz.pfad = pfad
+        if k.pfad != pfad:
+            k.pfad = pfad
+            geaendert.append(k)
+    Referenz.objects.bulk_update(geaendert, ["pfad"])
+
+
+def update_verwaiste_pfade(referenz_ids):
+    """
+    Stores the paths in the subtrees of references whose parent was deleted.
+    on_delete=SET_NULL detaches them without save() and leaves their tree
+    fields behind, so the subtrees are walked through oberreferenz, one query
+    per level.
+    """
+    ketten = {}
+    geaendert = []
+    ebene = list(Referenz.objects.filter(pk__in=referenz_ids))
+    while ebene:
+        for k in ebene:
+            ketten[k.pk] = ketten.get(k.oberreferenz_id, []) + [k]
+            pfad = k.Path(ketten[k.pk])
+            if k.pfad != pfad:
+                k.pfad = pfad
+                geaendert.append(k)
+        ebene = list(Referenz.objects.filter(oberreferenz__in=[k.pk for k in ebene]))
+    Referenz.objects.bulk_update(geaendert, ["pfad"])
+
+
+def referenz_pfade(referenzen):
+    """
+    Returns a dict {referenz.id: referenz.Path()} for the given Referenzen.
+    Stored paths are used as they are; the ancestors of references without
+    one are loaded with one query per VORFAHREN_CHUNK references instead of
+    one get_ancestors() query per reference.
+    """
+    pfade = {}
+    fehlend = {}
+    for r in referenzen:
+        if r.pfad:
+            pfade[r.id] = r.pfad
+        else:
+            fehlend[r.id] = r
+    if not fehlend:
+        return pfade
+
+    fehlend = list(fehlend.values())
+    for i in range(0, len(fehlend), VORFAHREN_CHUNK):
+        chunk = {r.id: r for r in fehlend[i:i + VORFAHREN_CHUNK]}
+        vorfahren = Q()
+        for r in chunk.values():
+            vorfahren |= Q(tree_id=r.tree_id, lft__lte=r.lft, rght__gte=r.rght)
+        knoten = Referenz.objects.filter(vorfahren).order_by("tree_id", "lft")
+        # the ancestor chains of several references of a tree still form a tree
+        for _, baum in groupby(knoten, key=attrgetter("tree_id")):
+            for k, pfad in baum_pfade(baum):
+                if k.id in chunk:
+                    pfade[k.id] = pfad
+    return pfade
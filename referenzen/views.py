@@ -1,21 +1,35 @@
+from django.conf import settings
+from django.core.cache import caches, DEFAULT_CACHE_ALIAS
 from django.shortcuts import render
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
 from .models import Referenz
 from abschnitte.utils import render_textabschnitte
+from standards.utils import VERZEICHNIS_KEY, get_version, vorgaben_unter
 
 # Create your views here.
 def tree(request):
-    referenz_items = Referenz.objects.all()
-    return render(request, 'referenz_tree.html', {'referenzen': referenz_items})
+    # The tree is rendered once per version of the Referenz pages.
+    version = get_version(VERZEICHNIS_KEY)
+    cache = caches[getattr(settings, "SEITEN_CACHE", DEFAULT_CACHE_ALIAS)]
+    key = "referenz_tree:%s" % (version.timestamp() if version else None)
+    baum = cache.get(key) if version else None
+    if baum is None:
+        baum = render_to_string('referenz_baum.html', {'referenzen': Referenz.objects.all()})
+        if version:
+            cache.set(key, baum)
+    return render(request, 'referenz_tree.html', {'baum': mark_safe(baum)})
 
 
 def detail(request, refid):
     referenz_item = Referenz.objects.get(id=refid)
     referenz_item.erklaerung = render_textabschnitte(referenz_item.referenzerklaerung_set.order_by("order"))
     referenz_item.children = list(referenz_item.get_descendants(include_self=True))
+    vorgaben = vorgaben_unter(referenz_item)
     for child in referenz_item.children:
-        child.referenziertvon = child.vorgabe_set.all()
-    if not referenz_item.is_root_node():
-        referenz_item.ParentID = referenz_item.get_ancestors(ascending=True)[0].id
+        child.referenziertvon = vorgaben.get(child.id, [])
+    if referenz_item.oberreferenz_id:
+        referenz_item.ParentID = referenz_item.oberreferenz_id
     return render(request, 'referenz_detail.html', {'referenz': referenz_item})
 
 
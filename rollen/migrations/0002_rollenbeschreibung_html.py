@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rollen', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rollenbeschreibung',
+            name='html',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+    ]
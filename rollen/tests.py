@@ -1,3 +1,29 @@
-from django.test import TestCase
+from standards.models import Inhaltsversion
+from standards.tests import InhaltTestCase
+from standards.utils import VERZEICHNIS_KEY, get_version
+from .models import RollenBeschreibung
 
-# Create your tests here.
+
+class RollePageTest(InhaltTestCase):
+    def test_relevant_vorgaben(self):
+        self.make_standard("KLEIN", 2)
+        with self.assertNumQueries(3):
+            response = self.client.get("/rollen/Betrieb/")
+        self.assertContains(response, "KLEIN.T.0</a>: Vorgabe 0")
+        self.assertContains(response, "KLEIN.T.1</a>: Vorgabe 1")
+
+        response = self.client.get("/rollen/Betrieb/history/2019-12-31/")
+        self.assertContains(response, "Keine Vorgaben in Kraft.")
+        self.assertContains(response, "am 31.12.2019")
+        self.assertEqual(self.client.get("/rollen/Unbekannt/").status_code, 404)
+
+    def test_edits_change_the_version(self):
+        # export-static renders the Rolle pages again when this version changes
+        Inhaltsversion.objects.filter(schluessel=VERZEICHNIS_KEY).delete()
+        RollenBeschreibung.objects.create(abschnitt=self.rolle, abschnitttyp=self.text, inhalt="Betreibt Systeme")
+        version = get_version(VERZEICHNIS_KEY)
+        self.assertIsNotNone(version)
+        self.assertContains(self.client.get("/rollen/Betrieb/"), "<p>Betreibt Systeme</p>")
+
+        self.rolle.save()
+        self.assertGreater(get_version(VERZEICHNIS_KEY), version)
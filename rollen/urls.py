@@ -0,0 +1,9 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('', views.rolle_list, name='rolle_list'),
+    path('<str:rolle>/', views.rolle_detail, name='rolle_detail'),
+    path('<str:rolle>/history/<str:check_date>/', views.rolle_detail, name='rolle_history'),
+    path('<str:rolle>/api/', views.rolle_api, name='rolle_api'),
+]
@@ -1,3 +1,66 @@
-from django.shortcuts import render
+from datetime import date
+from itertools import groupby
+from operator import attrgetter
 
-# Create your views here.
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.http import HttpResponseBadRequest, JsonResponse
+from django.shortcuts import get_object_or_404, render
+from django.urls import reverse
+
+from abschnitte.utils import render_textabschnitte
+from standards.models import Vorgabe
+from standards.utils import resolve_check_date
+from .models import Rolle
+
+
+def relevante_vorgaben(rolle, check_date=None):
+    """Vorgaben relevant for rolle and in force on check_date (default: today), in one query."""
+    return (Vorgabe.objects.filter(relevanz=rolle).active_on(check_date)
+            .select_related("dokument", "thema")
+            .order_by("dokument__nummer", "thema", "nummer"))
+
+
+def rolle_list(request):
+    aktive = (Vorgabe.objects.active_on().filter(relevanz=OuterRef("pk"))
+              .order_by().values("relevanz").annotate(anzahl=Count("pk")).values("anzahl"))
+    rollen = Rolle.objects.order_by("name").annotate(anzahl=Coalesce(Subquery(aktive), 0))
+    return render(request, 'rollen/rolle_list.html', {'rollen': rollen})
+
+
+def rolle_detail(request, rolle, check_date=""):
+    rolle = get_object_or_404(Rolle, name=rolle)
+    check_date, history = resolve_check_date(check_date)
+    rolle.beschreibung = render_textabschnitte(rolle.rollenbeschreibung_set.order_by("order"))
+    standards = [(dokument, list(vorgaben)) for dokument, vorgaben
+                 in groupby(relevante_vorgaben(rolle, check_date), key=attrgetter("dokument"))]
+    return render(request, 'rollen/rolle_detail.html', {
+        'rolle': rolle,
+        'check_date': check_date,
+        'history': history,
+        'standards': standards,
+    })
+
+
+def rolle_api(request, rolle):
+    """The Vorgaben of rolle in force on ?datum=YYYY-MM-DD (default: today) as JSON."""
+    rolle = get_object_or_404(Rolle, name=rolle)
+    try:
+        datum = date.fromisoformat(request.GET["datum"]) if request.GET.get("datum") else date.today()
+    except ValueError:
+        return HttpResponseBadRequest("datum must be YYYY-MM-DD")
+    return JsonResponse({
+        "rolle": rolle.name,
+        "datum": datum.isoformat(),
+        "vorgaben": [
+            {
+                "standard": v.dokument.nummer,
+                "vorgabe": v.Vorgabennummer(),
+                "titel": v.titel,
+                "gueltigkeit_von": v.gueltigkeit_von.isoformat(),
+                "gueltigkeit_bis": v.gueltigkeit_bis.isoformat() if v.gueltigkeit_bis else None,
+                "url": reverse("standard_detail", kwargs={"nummer": v.dokument.nummer}) + "#" + v.Vorgabennummer(),
+            }
+            for v in relevante_vorgaben(rolle, datum)
+        ],
+    })
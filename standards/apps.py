@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class standardsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'standards'
+
+    def ready(self):
+        from . import signals, suchindex
+        signals.connect()
+        from VorgabenUI.db import set_journal_mode
+        # The FTS5 table is not a Django model, so it is created after migrate.
+        post_migrate.connect(suchindex.create_table, sender=self)
+        post_migrate.connect(set_journal_mode, sender=self)
@@ -0,0 +1,120 @@
+"""
+Checklists for audits: the Checklistenfragen of one or more Standards,
+optionally limited to the Vorgaben relevant for some Rollen, as rows for the
+HTML page, as CSV (streamed, opens in Excel) or as an XLSX workbook.
+
+All questions are loaded in one query together with their Vorgabe, Standard
+and Thema, in the order of the standard pages.
+"""
+import csv
+import io
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from .models import Checklistenfrage
+
+SPALTEN = ("Standard", "Vorgabe", "Titel", "Frage")
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def checklistenfragen(standards=None, rollen=None):
+    """Questions of standards (default: all), limited to Vorgaben relevant for any of rollen if given."""
+    fragen = Checklistenfrage.objects.select_related("vorgabe__dokument", "vorgabe__thema").order_by(
+        "vorgabe__dokument__nummer", "vorgabe__thema", "vorgabe__nummer", "pk"
+    )
+    if standards is not None:
+        fragen = fragen.filter(vorgabe__dokument__in=standards)
+    if rollen:
+        fragen = fragen.filter(vorgabe__relevanz__in=rollen).distinct()
+    return fragen
+
+
+def zeilen(fragen):
+    """Yields one row (see SPALTEN) per question."""
+    for frage in fragen.iterator(chunk_size=500):
+        vorgabe = frage.vorgabe
+        yield vorgabe.dokument.nummer, vorgabe.Vorgabennummer(), vorgabe.titel, frage.frage
+
+
+class _Zeile:
+    """File-like object for csv.writer that hands back the formatted row."""
+
+    def write(self, wert):
+        return wert
+
+
+def csv_stream(fragen):
+    """Yields the checklist as CSV for Excel: UTF-8 with BOM, separated by semicolons."""
+    writer = csv.writer(_Zeile(), delimiter=";")
+    yield "\ufeff" + writer.writerow(SPALTEN)
+    for zeile in zeilen(fragen):
+        yield writer.writerow(zeile)
+
+
+# Characters XML 1.0 does not allow, not even escaped.
+_UNGUELTIG = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+_XLSX_RAHMEN = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        "</Types>"
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        "</Relationships>"
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Checkliste" sheetId="1" r:id="rId1"/></sheets>'
+        "</workbook>"
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        "</Relationships>"
+    ),
+}
+
+
+def _xlsx_zeile(werte):
+    zellen = "".join(
+        '<c t="inlineStr"><is><t xml:space="preserve">%s</t></is></c>' % escape(_UNGUELTIG.sub("", str(w)))
+        for w in werte
+    )
+    return "<row>%s</row>" % zellen
+
+
+def xlsx(fragen):
+    """Returns the checklist as an XLSX workbook with a single sheet, using inline strings."""
+    puffer = io.BytesIO()
+    with zipfile.ZipFile(puffer, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, inhalt in _XLSX_RAHMEN.items():
+            zf.writestr(name, inhalt)
+        with zf.open("xl/worksheets/sheet1.xml", "w") as blatt:
+            blatt.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+                + _xlsx_zeile(SPALTEN)
+            ).encode("utf-8"))
+            for zeile in zeilen(fragen):
+                blatt.write(_xlsx_zeile(zeile).encode("utf-8"))
+            blatt.write(b"</sheetData></worksheet>")
+    return puffer.getvalue()
@@ -0,0 +1,481 @@
+"""
+Parsing and bulk writing for the import-standard command.
+
+The text format consists of blocks starting with ">>>" and a header line:
+Einleitung, Geltungsbereich, Vorgabe <Thema>, Titel, Nummer, Kurztext,
+Langtext, Stichworte, Checkliste and the section types (Text, Liste geordnet,
+Liste ungeordnet). iter_blocks() and iter_records() parse it incrementally
+without touching the database; sections carry the normalized name of their
+AbschnittTyp. write_records() consumes the records in batches.
+"""
+from collections import Counter
+import hashlib
+import json
+import re
+import time
+from pathlib import Path
+
+from django.db import transaction
+from django.db.models import Prefetch, Q
+from django.utils import timezone
+
+from abschnitte.models import AbschnittTyp
+from stichworte.models import Stichwort
+from stichworte.utils import index_felder
+from . import suchindex
+from .models import (
+    Checklistenfrage,
+    Einleitung,
+    Geltungsbereich,
+    Thema,
+    Vorgabe,
+    VorgabeKurztext,
+    VorgabeLangtext,
+)
+from .utils import bump_versions, standard_key
+
+ABSCHNITTSTYP_NAMEN = {"text", "liste geordnet", "liste ungeordnet"}
+BATCH_SIZE = 500
+
+
+class SyncError(Exception):
+    pass
+
+
+def norm_header(h: str) -> str:
+    # normalize header: "liste-ungeordnet" -> "liste ungeordnet"
+    return h.lower().replace("-", " ").strip()
+
+
+def iter_blocks(lines):
+    """
+    Splits an iterable of lines (e.g. an open file) at lines starting with
+    ">>>" and yields (header, text) per block, holding only one block in memory.
+    """
+    buf = []
+
+    def block():
+        inhalt = "".join(buf).strip()
+        if inhalt:
+            zeilen = inhalt.splitlines()
+            return zeilen[0].strip(), "\n".join(zeilen[1:]).strip()
+
+    for line in lines:
+        if line.startswith(">>>"):
+            b = block()
+            if b:
+                yield b
+            buf = [line[3:]]
+        else:
+            buf.append(line)
+    b = block()
+    if b:
+        yield b
+
+
+def _stichworte(text):
+    return {k.strip() for k in text.split(",") if k.strip()}
+
+
+def iter_records(blocks):
+    """
+    Turns (header, text) blocks into records as soon as they are complete:
+    ("einleitung", section), ("geltungsbereich", section) and ("vorgabe",
+    vorgabe) with section = {inhalt, typ} and vorgabe = {thema, titel, nummer,
+    kurztext: [section], langtext: [section], stichworte: set, checkliste: [str]}.
+    """
+    current_context = "geltungsbereich"  # default before first Vorgabe
+    current_vorgabe = None
+
+    for header, text in blocks:
+        header_norm = norm_header(header)
+
+        # contexts
+        if header_norm == "einleitung":
+            current_context = "einleitung"
+            continue
+
+        if header_norm == "geltungsbereich":
+            current_context = "geltungsbereich"
+            continue
+
+        if header_norm.startswith("vorgabe"):
+            # previous one is complete
+            if current_vorgabe:
+                yield "vorgabe", current_vorgabe
+
+            parts = header.split(" ", 1)
+            thema_name = parts[1].strip() if len(parts) > 1 else ""
+            current_vorgabe = {
+                "thema": thema_name,
+                "titel": "",
+                "nummer": None,
+                "kurztext": [],
+                "langtext": [],
+                "stichworte": set(),
+                "checkliste": [],
+            }
+            current_context = "vorgabe_none"
+            continue
+
+        if header_norm.startswith("titel") and current_vorgabe:
+            # inline title or next text block
+            inline = header[len("Titel"):].strip() if header.startswith("Titel") else ""
+            current_vorgabe["titel"] = inline or text
+            continue
+
+        if header_norm.startswith("nummer") and current_vorgabe:
+            m = re.search(r"\d+", header)
+            if m:
+                current_vorgabe["nummer"] = int(m.group())
+            current_context = "vorgabe_none"
+            continue
+
+        if header_norm == "kurztext":
+            current_context = "vorgabe_kurztext"
+            continue
+
+        if header_norm == "langtext":
+            current_context = "vorgabe_langtext"
+            continue
+
+        if header_norm.startswith("stichworte") and current_vorgabe:
+            inline = header[len("Stichworte"):].strip() if header.startswith("Stichworte") else ""
+            kw_str = inline or text
+            if kw_str:
+                current_vorgabe["stichworte"] |= _stichworte(kw_str)
+            else:
+                current_context = "vorgabe_stichworte"
+            continue
+
+        if header_norm == "checkliste" and current_vorgabe:
+            if text:
+                current_vorgabe["checkliste"].extend([q.strip() for q in text.splitlines() if q.strip()])
+            else:
+                current_context = "vorgabe_checkliste"
+            continue
+
+        # Abschnitt content blocks
+        if header_norm in ABSCHNITTSTYP_NAMEN:
+            section = {"inhalt": text, "typ": header_norm}
+
+            if current_context in ("einleitung", "geltungsbereich"):
+                yield current_context, section
+
+            elif current_context == "vorgabe_kurztext" and current_vorgabe:
+                current_vorgabe["kurztext"].append(section)
+
+            elif current_context == "vorgabe_langtext" and current_vorgabe:
+                current_vorgabe["langtext"].append(section)
+
+            elif current_context == "vorgabe_stichworte" and current_vorgabe:
+                current_vorgabe["stichworte"] |= _stichworte(text)
+                current_context = "vorgabe_none"
+
+            elif current_context == "vorgabe_checkliste" and current_vorgabe:
+                current_vorgabe["checkliste"].extend([q.strip() for q in text.splitlines() if q.strip()])
+                current_context = "vorgabe_none"
+
+    # last vorgabe
+    if current_vorgabe:
+        yield "vorgabe", current_vorgabe
+
+
+def parse_standard(content):
+    """
+    Parses the whole text of a standard into
+    {"einleitung": [section], "geltungsbereich": [section], "vorgaben": [vorgabe]}
+    (see iter_records for the record layout).
+    """
+    data = {"einleitung": [], "geltungsbereich": [], "vorgaben": []}
+    for art, record in iter_records(iter_blocks(content.splitlines(keepends=True))):
+        data["vorgaben" if art == "vorgabe" else art].append(record)
+    return data
+
+
+def data_records(data):
+    """The records of parsed data, as produced by iter_records."""
+    for art in ("einleitung", "geltungsbereich"):
+        for section in data[art]:
+            yield art, section
+    for vorgabe in data["vorgaben"]:
+        yield "vorgabe", vorgabe
+
+
+def parse_file(path):
+    """
+    Reads and parses one import file. Returns (data, seconds); used as the
+    worker function of the parser process pool.
+    """
+    start = time.monotonic()
+    data = parse_standard(Path(path).read_text(encoding="utf-8"))
+    return data, time.monotonic() - start
+
+
+def resolve_abschnitttypen(warn=None):
+    """
+    Returns {name: AbschnittTyp} for all section types of the format. Missing
+    types fall back to "text" (reported through warn).
+    """
+    typen = AbschnittTyp.objects.in_bulk(list(ABSCHNITTSTYP_NAMEN | {"text"}))
+    for name in sorted(ABSCHNITTSTYP_NAMEN):
+        if name not in typen:
+            if warn:
+                warn(f"AbschnittTyp '{name}' not found; defaulting to 'text'.")
+            typen[name] = typen["text"]
+    return typen
+
+
+def _abschnitte(model, sections, typen, start=0, **fk):
+    objs = []
+    for order, s in enumerate(sections, start):
+        obj = model(abschnitttyp=typen[s["typ"]], inhalt=s["inhalt"], order=order, **fk)
+        obj.render_html()
+        objs.append(obj)
+    return objs
+
+
+class _BulkWriter:
+    """Buffers records of one standard and writes them with bulk_create."""
+
+    def __init__(self, standard, warn=None):
+        self.standard = standard
+        self.warn = warn
+        self.typen = resolve_abschnitttypen(warn)
+        self.themen = {}
+        self.heute = timezone.now().date()
+        self.sections = {"einleitung": [], "geltungsbereich": []}
+        self.order = {"einleitung": 0, "geltungsbereich": 0}
+        self.vorgaben = []
+        self.anzahl_vorgaben = 0
+        self.rows = 0
+
+    def __len__(self):
+        return len(self.vorgaben) + sum(len(s) for s in self.sections.values())
+
+    def add(self, art, record):
+        if art == "vorgabe":
+            self.vorgaben.append(record)
+        else:
+            self.sections[art].append(record)
+
+    def flush(self):
+        for art, model, fk in (("einleitung", Einleitung, "einleitung"),
+                               ("geltungsbereich", Geltungsbereich, "geltungsbereich")):
+            sections = self.sections[art]
+            objs = model.objects.bulk_create(
+                _abschnitte(model, sections, self.typen, self.order[art], **{fk: self.standard}), batch_size=BATCH_SIZE)
+            suchindex.index_abschnitte(model, objs)
+            self.order[art] += len(sections)
+            self.rows += len(objs)
+            self.sections[art] = []
+
+        fehlend = {v["thema"] for v in self.vorgaben} - set(self.themen)
+        if fehlend:
+            self.themen.update(Thema.objects.in_bulk(fehlend))
+        vorgaben_data = []
+        for v in self.vorgaben:
+            if v["thema"] in self.themen:
+                vorgaben_data.append(v)
+            elif self.warn:
+                self.warn(f"Thema '{v['thema']}' not found, skipping Vorgabe {v['nummer']}")
+        self.vorgaben = []
+        if not vorgaben_data:
+            return
+
+        vorgaben = Vorgabe.objects.bulk_create([
+            Vorgabe(nummer=v["nummer"], dokument=self.standard, thema=self.themen[v["thema"]], titel=v["titel"],
+                    gueltigkeit_von=self.heute)
+            for v in vorgaben_data
+        ], batch_size=BATCH_SIZE)
+
+        namen = {kw for v in vorgaben_data for kw in v["stichworte"]}
+        neu = namen - set(Stichwort.objects.filter(stichwort__in=namen).values_list("stichwort", flat=True))
+        Stichwort.objects.bulk_create([Stichwort(stichwort=kw, **index_felder(kw)) for kw in neu], ignore_conflicts=True, batch_size=BATCH_SIZE)
+
+        stichwort_links, fragen, kurztexte, langtexte = [], [], [], []
+        for vorgabe, v in zip(vorgaben, vorgaben_data):
+            stichwort_links += [Vorgabe.stichworte.through(vorgabe=vorgabe, stichwort_id=kw) for kw in sorted(v["stichworte"])]
+            fragen += [Checklistenfrage(vorgabe=vorgabe, frage=frage) for frage in v["checkliste"]]
+            kurztexte += _abschnitte(VorgabeKurztext, v["kurztext"], self.typen, abschnitt=vorgabe)
+            langtexte += _abschnitte(VorgabeLangtext, v["langtext"], self.typen, abschnitt=vorgabe)
+        Vorgabe.stichworte.through.objects.bulk_create(stichwort_links, batch_size=BATCH_SIZE)
+        Checklistenfrage.objects.bulk_create(fragen, batch_size=BATCH_SIZE)
+        kurztexte = VorgabeKurztext.objects.bulk_create(kurztexte, batch_size=BATCH_SIZE)
+        langtexte = VorgabeLangtext.objects.bulk_create(langtexte, batch_size=BATCH_SIZE)
+
+        suchindex.index_abschnitte(VorgabeKurztext, kurztexte)
+        suchindex.index_abschnitte(VorgabeLangtext, langtexte)
+        suchindex.index_vorgaben([v.pk for v in vorgaben])
+        self.anzahl_vorgaben += len(vorgaben)
+        self.rows += (len(vorgaben) + len(neu) + len(stichwort_links) + len(fragen)
+                      + len(kurztexte) + len(langtexte))
+
+
+def write_records(standard, records, warn=None, batch_size=BATCH_SIZE):
+    """
+    Writes the records (see iter_records) of standard inside one transaction,
+    with bulk inserts of batch_size Vorgaben/sections at a time, so records
+    can be consumed while they are being parsed. Lookup tables (AbschnittTyp,
+    Thema, Stichwort) are resolved once per batch at most. As bulk_create
+    bypasses signals, the search index and the content version are updated
+    explicitly. Returns (number of Vorgaben, number of rows written).
+    """
+    with transaction.atomic():
+        writer = _BulkWriter(standard, warn)
+        for art, record in records:
+            writer.add(art, record)
+            if len(writer) >= batch_size:
+                writer.flush()
+        writer.flush()
+        bump_versions([standard_key(standard.nummer)])
+    return writer.anzahl_vorgaben, writer.rows
+
+
+def write_bulk(standard, data, warn=None):
+    """write_records for data returned by parse_standard."""
+    return write_records(standard, data_records(data), warn)
+
+
+def _teile(v, typen):
+    return {
+        "titel": v["titel"],
+        "kurztext": [(typen[s["typ"]].pk, s["inhalt"]) for s in v["kurztext"]],
+        "langtext": [(typen[s["typ"]].pk, s["inhalt"]) for s in v["langtext"]],
+        "stichworte": sorted(v["stichworte"]),
+        "checkliste": list(v["checkliste"]),
+    }
+
+
+def _db_teile(vorgabe):
+    return {
+        "titel": vorgabe.titel,
+        "kurztext": [(a.abschnitttyp_id, a.inhalt) for a in vorgabe.vorgabekurztext_set.all()],
+        "langtext": [(a.abschnitttyp_id, a.inhalt) for a in vorgabe.vorgabelangtext_set.all()],
+        "stichworte": sorted(s.pk for s in vorgabe.stichworte.all()),
+        "checkliste": [f.frage for f in vorgabe.checklistenfragen.all()],
+    }
+
+
+def inhalt_hash(teile):
+    """Hash of the comparable content of a Vorgabe (see _teile)."""
+    return hashlib.sha256(json.dumps(teile, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _replace_abschnitte(queryset, model, sections, **fk):
+    # saved one by one so that signals update html, search index and version
+    rows = queryset.delete()[0]
+    for order, (typ, inhalt) in enumerate(sections):
+        model.objects.create(abschnitttyp_id=typ, inhalt=inhalt, order=order, **fk)
+    return rows + len(sections)
+
+
+def _update_vorgabe(vorgabe, alt, neu):
+    rows = 0
+    if alt["titel"] != neu["titel"]:
+        vorgabe.titel = neu["titel"]
+        vorgabe.save(update_fields=["titel"])
+        rows += 1
+    for teil, model in (("kurztext", VorgabeKurztext), ("langtext", VorgabeLangtext)):
+        if alt[teil] != neu[teil]:
+            rows += _replace_abschnitte(model.objects.filter(abschnitt=vorgabe), model, neu[teil], abschnitt=vorgabe)
+    if alt["stichworte"] != neu["stichworte"]:
+        vorgabe.stichworte.set([Stichwort.objects.get_or_create(stichwort=kw)[0] for kw in neu["stichworte"]])
+        rows += len(set(alt["stichworte"]) ^ set(neu["stichworte"]))
+    if alt["checkliste"] != neu["checkliste"]:
+        rows += vorgabe.checklistenfragen.all().delete()[0]
+        for frage in neu["checkliste"]:
+            Checklistenfrage.objects.create(vorgabe=vorgabe, frage=frage)
+        rows += len(neu["checkliste"])
+    return rows
+
+
+def sync_standard(standard, records, warn=None):
+    """
+    Brings the content of standard in line with records (see iter_records)
+    and writes only what differs. Vorgaben that are in force now or later are
+    matched by (thema, nummer) and compared by inhalt_hash:
+
+    - new ones are bulk inserted,
+    - changed ones are updated in place, so their id, Referenzen and Relevanz
+      survive; only the changed parts are rewritten,
+    - ones missing from records are deleted.
+
+    Expired Vorgaben are history and left alone. Einleitung and
+    Geltungsbereich are rewritten only if they differ. Returns a Counter with
+    inserted, updated, deleted and unchanged Vorgaben and the rows written.
+
+    Raises SyncError without writing anything if several Vorgaben in force
+    now or later share a (thema, nummer): which of them the file means is
+    for an author to decide, e.g. by ending all but one.
+    """
+    summary = Counter()
+    typen = resolve_abschnitttypen(warn)
+    heute = timezone.now().date()
+    ordnung = ("order", "pk")
+
+    with transaction.atomic():
+        bestehend = {}
+        vorgaben = (
+            standard.vorgaben.filter(Q(gueltigkeit_bis__isnull=True) | Q(gueltigkeit_bis__gt=heute))
+            .order_by("gueltigkeit_von", "pk")
+            .prefetch_related(
+                Prefetch("vorgabekurztext_set", queryset=VorgabeKurztext.objects.order_by(*ordnung)),
+                Prefetch("vorgabelangtext_set", queryset=VorgabeLangtext.objects.order_by(*ordnung)),
+                "stichworte",
+                Prefetch("checklistenfragen", queryset=Checklistenfrage.objects.order_by("pk")),
+            )
+        )
+        doppelt = {}
+        for vorgabe in vorgaben:
+            key = (vorgabe.thema_id, vorgabe.nummer)
+            if key in bestehend:
+                doppelt.setdefault(key, [bestehend[key].pk]).append(vorgabe.pk)
+            bestehend[key] = vorgabe
+        if doppelt:
+            raise SyncError("Several Vorgaben in force share a number: " + "; ".join(
+                f"{thema} {nummer} (ids {', '.join(map(str, ids))})" for (thema, nummer), ids in sorted(doppelt.items())
+            ))
+
+        gesehen = set()
+        sections = {"einleitung": [], "geltungsbereich": []}
+        writer = _BulkWriter(standard, warn)
+        for art, record in records:
+            if art != "vorgabe":
+                sections[art].append((typen[record["typ"]].pk, record["inhalt"]))
+                continue
+            key = (record["thema"], record["nummer"])
+            if record["nummer"] is None or key in gesehen:
+                if warn:
+                    warn(f"Vorgabe {record['thema']} {record['nummer']}: missing or duplicate number, skipped")
+                continue
+            gesehen.add(key)
+            vorgabe = bestehend.get(key)
+            if vorgabe is None:
+                writer.add(art, record)
+                if len(writer) >= BATCH_SIZE:
+                    writer.flush()
+                continue
+            alt, neu = _db_teile(vorgabe), _teile(record, typen)
+            if inhalt_hash(alt) == inhalt_hash(neu):
+                summary["unchanged"] += 1
+            else:
+                summary["rows"] += _update_vorgabe(vorgabe, alt, neu)
+                summary["updated"] += 1
+        writer.flush()
+        summary["inserted"] += writer.anzahl_vorgaben
+        summary["rows"] += writer.rows
+
+        for key, vorgabe in bestehend.items():
+            if key not in gesehen:
+                summary["rows"] += vorgabe.delete()[0]
+                summary["deleted"] += 1
+
+        for art, model in (("einleitung", Einleitung), ("geltungsbereich", Geltungsbereich)):
+            queryset = model.objects.filter(**{art: standard}).order_by(*ordnung)
+            if list(queryset.values_list("abschnitttyp_id", "inhalt")) != sections[art]:
+                summary["rows"] += _replace_abschnitte(queryset, model, sections[art], **{art: standard})
+
+        if writer.rows:
+            bump_versions([standard_key(standard.nummer)])
+    return summary
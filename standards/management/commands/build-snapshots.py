@@ -0,0 +1,27 @@
+# standards/management/commands/build-snapshots.py
+from django.core.management.base import BaseCommand, CommandError
+
+from standards.models import Standard
+from standards.snapshots import build_snapshots
+
+
+class Command(BaseCommand):
+    help = (
+        "Materialize the history view of Standards as of each validity boundary of their Vorgaben.\n"
+        "Snapshots of the current content version that already exist are kept."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("nummer", nargs="*", help="Standard numbers (default: all Standards)")
+
+    def handle(self, *args, **options):
+        standards = Standard.objects.prefetch_related("autoren", "pruefende")
+        if options["nummer"]:
+            standards = standards.filter(nummer__in=options["nummer"])
+            if len(standards) != len(set(options["nummer"])):
+                raise CommandError("Unknown Standard in %s" % ", ".join(options["nummer"]))
+
+        for standard in standards:
+            count = build_snapshots(standard)
+            self.stdout.write(f"{standard.nummer}: {count} Snapshots")
+        self.stdout.write(self.style.SUCCESS("Snapshots built"))
@@ -1,7 +1,12 @@
 # Standards/management/commands/import_standard.py
-import re
+import csv
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
 from django.utils import timezone
 
 from standards.models import (
@@ -15,7 +20,18 @@ from standards.models import (
     Einleitung,           # <-- make sure this model exists as a Textabschnitt subclass
     Checklistenfrage,
 )
-from abschnitte.models import AbschnittTyp
+from standards.importer import (
+    data_records,
+    iter_blocks,
+    iter_records,
+    parse_file,
+    parse_standard,
+    resolve_abschnitttypen,
+    SyncError,
+    sync_standard,
+    write_bulk,
+    write_records,
+)
 from stichworte.models import Stichwort
 
 
@@ -23,34 +39,52 @@ class Command(BaseCommand):
     help = (
         "Import a security standard from a structured text file.\n"
         "Supports Einleitung, Geltungsbereich, Vorgaben (Kurztext/Langtext with AbschnittTyp), "
-        "Stichworte (comma-separated), Checklistenfragen, dry-run, verbose, and purge."
+        "Stichworte (comma-separated), Checklistenfragen, dry-run, verbose, purge, bulk and sync.\n"
+        "With --manifest, file_path may be a directory or glob; the files are parsed in parallel "
+        "and written one by one with bulk inserts."
     )
 
     def add_arguments(self, parser):
-        parser.add_argument("file_path", type=str, help="Path to the plaintext file")
-        parser.add_argument("--nummer", required=True, help="Standard number (e.g., STD-001)")
-        parser.add_argument("--name", required=True, help='Standard name (e.g., "IT-Sicherheit Container")')
-        parser.add_argument("--dokumententyp", required=True, help='Dokumententyp name (e.g., "IT-Sicherheit")')
+        parser.add_argument("file_path", type=str, help="Path to the plaintext file (directory or glob with --manifest)")
+        parser.add_argument("--nummer", help="Standard number (e.g., STD-001)")
+        parser.add_argument("--name", help='Standard name (e.g., "IT-Sicherheit Container")')
+        parser.add_argument("--dokumententyp", help='Dokumententyp name (e.g., "IT-Sicherheit")')
         parser.add_argument("--gueltigkeit_von", default=None, help="Start date (YYYY-MM-DD)")
         parser.add_argument("--gueltigkeit_bis", default=None, help="End date (YYYY-MM-DD)")
         parser.add_argument("--dry-run", action="store_true", help="Perform a dry run without saving to DB")
         parser.add_argument("--verbose", action="store_true", help="Verbose output for dry run")
         parser.add_argument("--purge", action="store_true", help="Delete existing Einleitung/Geltungsbereich/Vorgaben first")
-
-    # normalize header: "liste-ungeordnet" -> "liste ungeordnet"
-    @staticmethod
-    def _norm_header(h: str) -> str:
-        return h.lower().replace("-", " ").strip()
+        parser.add_argument("--bulk", action="store_true", help="Write everything with bulk inserts in one transaction")
+        parser.add_argument(
+            "--sync",
+            action="store_true",
+            help="Update an existing standard in place: only new, changed and removed Vorgaben are written",
+        )
+        parser.add_argument(
+            "--manifest",
+            help="CSV file with the columns file, nummer, name, dokumententyp "
+                 "(optional: gueltigkeit_von, gueltigkeit_bis), one row per file",
+        )
+        parser.add_argument("--workers", type=int, default=None, help="Number of parser processes (default: CPU count)")
 
     def handle(self, *args, **options):
+        if options["sync"] and (options["purge"] or options["bulk"]):
+            raise CommandError("--sync cannot be combined with --purge or --bulk")
+        if options["manifest"]:
+            return self.handle_manifest(options)
+
         dry_run = options["dry_run"]
         verbose = options["verbose"]
         purge = options["purge"]
+        bulk = options["bulk"]
 
         file_path = Path(options["file_path"])
         if not file_path.exists():
             raise CommandError(f"File {file_path} does not exist")
 
+        for option in ("nummer", "name", "dokumententyp"):
+            if not options[option]:
+                raise CommandError(f"--{option} is required without --manifest")
         nummer = options["nummer"]
         name = options["name"]
         dokumententyp_name = options["dokumententyp"]
@@ -62,200 +96,47 @@ class Command(BaseCommand):
 
         if dry_run:
             self.stdout.write(self.style.WARNING("Dry run: no database changes will be made."))
+            if verbose:
+                with file_path.open(encoding="utf-8") as f:
+                    self.report_sections(iter_records(iter_blocks(f)))
 
-        # get or create Standard (we want a real instance even in purge to count existing rows)
-        standard, created = Standard.objects.get_or_create(
-            nummer=nummer,
-            defaults={
-                "dokumententyp": dokumententyp,
-                "name": name,
-                "gueltigkeit_von": options["gueltigkeit_von"],
-                "gueltigkeit_bis": options["gueltigkeit_bis"],
-            },
-        )
-        if created:
-            self.stdout.write(self.style.SUCCESS(f"Created Standard {nummer} – {name}"))
-        else:
-            self.stdout.write(self.style.WARNING(f"Standard {nummer} already exists; content may be updated."))
-
-        # purge (Einleitung + Geltungsbereich + Vorgaben cascade)
+        standard = self.get_standard(nummer, name, dokumententyp, options["gueltigkeit_von"], options["gueltigkeit_bis"])
         if purge:
-            qs_vorgaben = standard.vorgaben.all()
-            qs_check = Checklistenfrage.objects.filter(vorgabe__in=qs_vorgaben)
-            qs_kurz = VorgabeKurztext.objects.filter(abschnitt__in=qs_vorgaben)
-            qs_lang = VorgabeLangtext.objects.filter(abschnitt__in=qs_vorgaben)
-            qs_gb = Geltungsbereich.objects.filter(geltungsbereich=standard)
-            qs_einl = Einleitung.objects.filter(einleitung=standard)
-
-            c_vorgaben = qs_vorgaben.count()
-            c_check = qs_check.count()
-            c_kurz = qs_kurz.count()
-            c_lang = qs_lang.count()
-            c_gb = qs_gb.count()
-            c_einl = qs_einl.count()
-
-            if dry_run:
-                self.stdout.write(self.style.WARNING(
-                    f"[DRY RUN] Would purge: {c_einl} Einleitung-Abschnitte, "
-                    f"{c_gb} Geltungsbereich-Abschnitte, {c_vorgaben} Vorgaben "
-                    f"({c_kurz} Kurztext, {c_lang} Langtext, {c_check} Checklistenfragen)."
-                ))
-            else:
-                deleted_einl = qs_einl.delete()[0]
-                deleted_gb = qs_gb.delete()[0]
-                deleted_vorgaben = qs_vorgaben.delete()[0]
-                self.stdout.write(self.style.SUCCESS(
-                    f"Purged {deleted_einl} Einleitung, {deleted_gb} Geltungsbereich, "
-                    f"{deleted_vorgaben} Vorgaben (incl. Kurz/Lang/Checklistenfragen)."
-                ))
-
-        # read and split file
-        content = file_path.read_text(encoding="utf-8")
-        blocks = re.split(r"^>>>", content, flags=re.MULTILINE)
-        blocks = [b.strip() for b in blocks if b.strip()]
-
-        # state
-        abschnittstyp_names = {"text", "liste geordnet", "liste ungeordnet"}
-        current_context = "geltungsbereich"  # default before first Vorgabe
-
-        einleitung_sections = []       # list of {inhalt, typ: AbschnittTyp}
-        geltungsbereich_sections = []  # list of {inhalt, typ: AbschnittTyp}
-
-        current_vorgabe = None
-        vorgaben_data = []  # each: {thema, titel, nummer, kurztext:[{inhalt,typ}], langtext:[{inhalt,typ}], stichworte:set(), checkliste:[str]}
-
-        for block in blocks:
-            lines = block.splitlines()
-            header = lines[0].strip()
-            text = "\n".join(lines[1:]).strip()
-            header_norm = self._norm_header(header)
-
-            # resolve AbschnittTyp if this is a section block
-            abschnitt_typ = None
-            if header_norm in abschnittstyp_names:
-                try:
-                    abschnitt_typ = AbschnittTyp.objects.get(abschnitttyp=header_norm)
-                except AbschnittTyp.DoesNotExist:
-                    self.stdout.write(self.style.WARNING(
-                        f"AbschnittTyp '{header_norm}' not found; defaulting to 'text'."
-                    ))
-                    abschnitt_typ = AbschnittTyp.objects.get(abschnitttyp="text")
-
-            # contexts
-            if header_norm == "einleitung":
-                current_context = "einleitung"
-                continue
-
-            if header_norm == "geltungsbereich":
-                current_context = "geltungsbereich"
-                continue
-
-            if header_norm.startswith("vorgabe"):
-                # save previous
-                if current_vorgabe:
-                    vorgaben_data.append(current_vorgabe)
-
-                parts = header.split(" ", 1)
-                thema_name = parts[1].strip() if len(parts) > 1 else ""
-                current_vorgabe = {
-                    "thema": thema_name,
-                    "titel": "",
-                    "nummer": None,
-                    "kurztext": [],
-                    "langtext": [],
-                    "stichworte": set(),
-                    "checkliste": [],
-                }
-                current_context = "vorgabe_none"
-                continue
-
-            if header_norm.startswith("titel") and current_vorgabe:
-                # inline title or next text block
-                inline = header[len("Titel"):].strip() if header.startswith("Titel") else ""
-                title_value = inline or text
-                current_vorgabe["titel"] = title_value
-                continue
-
-            if header_norm.startswith("nummer") and current_vorgabe:
-                m = re.search(r"\d+", header)
-                if m:
-                    current_vorgabe["nummer"] = int(m.group())
-                current_context = "vorgabe_none"
-                continue
-
-            if header_norm == "kurztext":
-                current_context = "vorgabe_kurztext"
-                continue
-
-            if header_norm == "langtext":
-                current_context = "vorgabe_langtext"
-                continue
-
-            if header_norm.startswith("stichworte") and current_vorgabe:
-                inline = header[len("Stichworte"):].strip() if header.startswith("Stichworte") else ""
-                kw_str = inline or text
-                if kw_str:
-                    for k in kw_str.split(","):
-                        k = k.strip()
-                        if k:
-                            current_vorgabe["stichworte"].add(k)
-                else:
-                    current_context = "vorgabe_stichworte"
-                continue
-
-            if header_norm == "checkliste" and current_vorgabe:
-                if text:
-                    current_vorgabe["checkliste"].extend([q.strip() for q in text.splitlines() if q.strip()])
-                else:
-                    current_context = "vorgabe_checkliste"
-                continue
-
-            # Abschnitt content blocks
-            if header_norm in abschnittstyp_names:
-                section = {"inhalt": text, "typ": abschnitt_typ}
-
-                if current_context == "einleitung":
-                    einleitung_sections.append(section)
-                    if dry_run and verbose:
-                        self.stdout.write(self.style.SUCCESS(
-                            f"[DRY RUN] Einleitung Abschnitt ({section['typ']}): {text[:50]}..."
-                        ))
-
-                elif current_context == "geltungsbereich":
-                    geltungsbereich_sections.append(section)
-                    if dry_run and verbose:
-                        self.stdout.write(self.style.SUCCESS(
-                            f"[DRY RUN] Geltungsbereich Abschnitt ({section['typ']}): {text[:50]}..."
-                        ))
-
-                elif current_context == "vorgabe_kurztext" and current_vorgabe:
-                    current_vorgabe["kurztext"].append(section)
-                    if dry_run and verbose:
-                        self.stdout.write(self.style.SUCCESS(
-                            f"[DRY RUN] Vorgabe {current_vorgabe.get('nummer')} Kurztext ({section['typ']}): {text[:50]}..."
-                        ))
-
-                elif current_context == "vorgabe_langtext" and current_vorgabe:
-                    current_vorgabe["langtext"].append(section)
-                    if dry_run and verbose:
-                        self.stdout.write(self.style.SUCCESS(
-                            f"[DRY RUN] Vorgabe {current_vorgabe.get('nummer')} Langtext ({section['typ']}): {text[:50]}..."
-                        ))
-
-                elif current_context == "vorgabe_stichworte" and current_vorgabe:
-                    for k in text.split(","):
-                        k = k.strip()
-                        if k:
-                            current_vorgabe["stichworte"].add(k)
-                    current_context = "vorgabe_none"
-
-                elif current_context == "vorgabe_checkliste" and current_vorgabe:
-                    current_vorgabe["checkliste"].extend([q.strip() for q in text.splitlines() if q.strip()])
-                    current_context = "vorgabe_none"
-
-        # append last vorgabe
-        if current_vorgabe:
-            vorgaben_data.append(current_vorgabe)
+            self.purge(standard, dry_run)
+
+        if options["sync"]:
+            with file_path.open(encoding="utf-8") as f:
+                self.sync(standard, iter_records(iter_blocks(f)), dry_run)
+            return
+
+        if bulk and not dry_run:
+            # the file is parsed while it is written
+            start = time.monotonic()
+            with file_path.open(encoding="utf-8") as f:
+                anzahl, rows = write_records(
+                    standard, iter_records(iter_blocks(f)),
+                    warn=lambda msg: self.stdout.write(self.style.WARNING(msg)),
+                )
+            seconds = time.monotonic() - start
+            self.stdout.write(self.style.SUCCESS(
+                f"Imported standard {nummer} – {name} with {anzahl} Vorgaben: "
+                f"{rows} rows in {seconds:.2f}s ({rows / max(seconds, 1e-6):.0f} rows/s)"
+            ))
+            return
+
+        # read and parse file
+        data = parse_standard(file_path.read_text(encoding="utf-8"))
+        einleitung_sections = data["einleitung"]
+        geltungsbereich_sections = data["geltungsbereich"]
+        vorgaben_data = data["vorgaben"]
+
+        typen = resolve_abschnitttypen(warn=lambda msg: self.stdout.write(self.style.WARNING(msg)))
+        for sektion in einleitung_sections + geltungsbereich_sections:
+            sektion["typ"] = typen[sektion["typ"]]
+        for v in vorgaben_data:
+            for sektion in v["kurztext"] + v["langtext"]:
+                sektion["typ"] = typen[sektion["typ"]]
+        themen = Thema.objects.in_bulk({v["thema"] for v in vorgaben_data}, field_name="name")
 
         # === SAVE: Einleitung ===
         for sektion in einleitung_sections:
@@ -285,9 +166,8 @@ class Command(BaseCommand):
 
         # === SAVE: Vorgaben and children ===
         for v in vorgaben_data:
-            try:
-                thema = Thema.objects.get(name=v["thema"])
-            except Thema.DoesNotExist:
+            thema = themen.get(v["thema"])
+            if thema is None:
                 self.stdout.write(self.style.WARNING(
                     f"Thema '{v['thema']}' not found, skipping Vorgabe {v['nummer']}"
                 ))
@@ -350,3 +230,170 @@ class Command(BaseCommand):
             "Dry run complete" if dry_run else f"Imported standard {nummer} – {name} with {len(vorgaben_data)} Vorgaben"
         ))
 
+    def report_sections(self, records):
+        """Lists every parsed Abschnitt, for --dry-run --verbose."""
+        for art, record in records:
+            if art != "vorgabe":
+                self.stdout.write(self.style.SUCCESS(
+                    f"[DRY RUN] {art.capitalize()} Abschnitt ({record['typ']}): {record['inhalt'][:50]}..."
+                ))
+                continue
+            for teil in ("kurztext", "langtext"):
+                for section in record[teil]:
+                    self.stdout.write(self.style.SUCCESS(
+                        f"[DRY RUN] Vorgabe {record['nummer']} {teil.capitalize()} ({section['typ']}): "
+                        f"{section['inhalt'][:50]}..."
+                    ))
+
+    def get_standard(self, nummer, name, dokumententyp, gueltigkeit_von, gueltigkeit_bis):
+        # get or create Standard (we want a real instance even in purge to count existing rows)
+        standard, created = Standard.objects.get_or_create(
+            nummer=nummer,
+            defaults={
+                "dokumententyp": dokumententyp,
+                "name": name,
+                "gueltigkeit_von": gueltigkeit_von,
+                "gueltigkeit_bis": gueltigkeit_bis,
+            },
+        )
+        if created:
+            self.stdout.write(self.style.SUCCESS(f"Created Standard {nummer} – {name}"))
+        else:
+            self.stdout.write(self.style.WARNING(f"Standard {nummer} already exists; content may be updated."))
+        return standard
+
+    def purge(self, standard, dry_run):
+        # purge (Einleitung + Geltungsbereich + Vorgaben cascade)
+        qs_vorgaben = standard.vorgaben.all()
+        qs_check = Checklistenfrage.objects.filter(vorgabe__in=qs_vorgaben)
+        qs_kurz = VorgabeKurztext.objects.filter(abschnitt__in=qs_vorgaben)
+        qs_lang = VorgabeLangtext.objects.filter(abschnitt__in=qs_vorgaben)
+        qs_gb = Geltungsbereich.objects.filter(geltungsbereich=standard)
+        qs_einl = Einleitung.objects.filter(einleitung=standard)
+
+        c_vorgaben = qs_vorgaben.count()
+        c_check = qs_check.count()
+        c_kurz = qs_kurz.count()
+        c_lang = qs_lang.count()
+        c_gb = qs_gb.count()
+        c_einl = qs_einl.count()
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING(
+                f"[DRY RUN] Would purge: {c_einl} Einleitung-Abschnitte, "
+                f"{c_gb} Geltungsbereich-Abschnitte, {c_vorgaben} Vorgaben "
+                f"({c_kurz} Kurztext, {c_lang} Langtext, {c_check} Checklistenfragen)."
+            ))
+        else:
+            deleted_einl = qs_einl.delete()[0]
+            deleted_gb = qs_gb.delete()[0]
+            deleted_vorgaben = qs_vorgaben.delete()[0]
+            self.stdout.write(self.style.SUCCESS(
+                f"Purged {deleted_einl} Einleitung, {deleted_gb} Geltungsbereich, "
+                f"{deleted_vorgaben} Vorgaben (incl. Kurz/Lang/Checklistenfragen)."
+            ))
+
+    def sync(self, standard, records, dry_run):
+        with transaction.atomic():
+            try:
+                summary = sync_standard(standard, records, warn=lambda msg: self.stdout.write(self.style.WARNING(msg)))
+            except SyncError as e:
+                raise CommandError(f"{standard.nummer}: {e}")
+            if dry_run:
+                transaction.set_rollback(True)
+        self.stdout.write(self.style.SUCCESS(
+            f"{'[DRY RUN] Would sync' if dry_run else 'Synced'} {standard.nummer}: "
+            f"{summary['inserted']} inserted, {summary['updated']} updated, {summary['deleted']} deleted, "
+            f"{summary['unchanged']} unchanged Vorgaben ({summary['rows']} rows)"
+        ))
+        return summary
+
+    def read_manifest(self, manifest_path):
+        # file name -> row; "file" may contain a path, only the name is matched
+        try:
+            with open(manifest_path, newline="", encoding="utf-8") as f:
+                rows = list(csv.DictReader(f))
+        except OSError as e:
+            raise CommandError(f"Cannot read manifest {manifest_path}: {e}")
+        manifest = {}
+        for row in rows:
+            if not all(row.get(spalte) for spalte in ("file", "nummer", "name", "dokumententyp")):
+                raise CommandError(f"Incomplete manifest row: {row}")
+            manifest[Path(row["file"]).name] = row
+        return manifest
+
+    def find_files(self, pattern):
+        path = Path(pattern)
+        if path.is_dir():
+            return sorted(p for p in path.glob("*.txt") if p.is_file())
+        return sorted(Path(p) for p in glob.glob(pattern) if Path(p).is_file())
+
+    def handle_manifest(self, options):
+        dry_run = options["dry_run"]
+        manifest = self.read_manifest(options["manifest"])
+        files = []
+        for path in self.find_files(options["file_path"]):
+            if path.name in manifest:
+                files.append(path)
+            else:
+                self.stdout.write(self.style.WARNING(f"{path}: not in manifest, skipped"))
+        if not files:
+            raise CommandError(f"No files from the manifest match {options['file_path']}")
+        gefunden = {path.name for path in files}
+        for datei in sorted(set(manifest) - gefunden):
+            self.stdout.write(self.style.WARNING(f"{datei}: listed in manifest but not found"))
+
+        dokumententypen = Dokumententyp.objects.in_bulk({manifest[p.name]["dokumententyp"] for p in files}, field_name="name")
+        if dry_run:
+            self.stdout.write(self.style.WARNING("Dry run: no database changes will be made."))
+
+        # forked parser processes must not share the open database connection
+        connections.close_all()
+        start = time.monotonic()
+        fehler, zeilen = [], 0
+        with ProcessPoolExecutor(max_workers=options["workers"] or os.cpu_count()) as pool:
+            futures = [(path, pool.submit(parse_file, str(path))) for path in files]
+            # results are written in file order by this process only
+            for path, future in futures:
+                eintrag = manifest[path.name]
+                try:
+                    data, parse_seconds = future.result()
+                    dokumententyp = dokumententypen.get(eintrag["dokumententyp"])
+                    if dokumententyp is None:
+                        raise CommandError(f"Dokumententyp '{eintrag['dokumententyp']}' does not exist")
+                    if dry_run:
+                        if options["verbose"]:
+                            self.report_sections(data_records(data))
+                        self.stdout.write(self.style.SUCCESS(
+                            f"[DRY RUN] {path.name}: {eintrag['nummer']} with {len(data['vorgaben'])} Vorgaben, "
+                            f"parsed in {parse_seconds:.2f}s"
+                        ))
+                        continue
+                    write_start = time.monotonic()
+                    with transaction.atomic():
+                        standard = self.get_standard(
+                            eintrag["nummer"], eintrag["name"], dokumententyp,
+                            eintrag.get("gueltigkeit_von") or None, eintrag.get("gueltigkeit_bis") or None,
+                        )
+                        if options["sync"]:
+                            summary = self.sync(standard, data_records(data), dry_run)
+                            anzahl, rows = summary["inserted"] + summary["updated"], summary["rows"]
+                        else:
+                            if options["purge"]:
+                                self.purge(standard, dry_run)
+                            anzahl, rows = write_bulk(standard, data, warn=lambda msg: self.stdout.write(self.style.WARNING(msg)))
+                    zeilen += rows
+                    self.stdout.write(self.style.SUCCESS(
+                        f"{path.name}: {eintrag['nummer']} with {anzahl} Vorgaben, {rows} rows "
+                        f"(parse {parse_seconds:.2f}s, write {time.monotonic() - write_start:.2f}s)"
+                    ))
+                except Exception as e:
+                    fehler.append(path.name)
+                    self.stderr.write(self.style.ERROR(f"{path.name}: import failed: {e}"))
+
+        seconds = time.monotonic() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {len(files) - len(fehler)} of {len(files)} files: {zeilen} rows in {seconds:.2f}s"
+        ))
+        if fehler:
+            raise CommandError(f"Import failed for: {', '.join(fehler)}")
@@ -0,0 +1,63 @@
+# standards/management/commands/publish.py
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+
+class Command(BaseCommand):
+    help = (
+        "Publish the live database as an immutable copy for the portal pods.\n"
+        "Builds the history snapshots, copies the database with the SQLite backup API into a new file, "
+        "fsyncs it and renames it over the published copy, so readers see either the old or the new copy."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--target",
+            default=settings.PUBLISHED_DB or settings.BASE_DIR / "data/published.sqlite3",
+            help="Path of the published copy (default: SQLITE_PUBLISHED_DB or data/published.sqlite3)",
+        )
+        parser.add_argument("--skip-snapshots", action="store_true", help="Do not build history snapshots first")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("publish only works with SQLite")
+        target = Path(options["target"])
+        tmp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+        start = time.monotonic()
+
+        if not options["skip_snapshots"]:
+            call_command("build-snapshots", stdout=self.stdout)
+
+        connection.ensure_connection()
+        try:
+            kopie = sqlite3.connect(tmp)
+            try:
+                connection.connection.backup(kopie)
+                # the copy is opened with immutable=1: a single file without -wal
+                kopie.execute("PRAGMA journal_mode=DELETE")
+                kopie.execute("ANALYZE")
+                kopie.commit()
+            finally:
+                kopie.close()
+            with open(tmp, "rb") as f:
+                os.fsync(f.fileno())
+            os.replace(tmp, target)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        verzeichnis = os.open(target.parent, os.O_RDONLY)
+        try:
+            os.fsync(verzeichnis)
+        finally:
+            os.close(verzeichnis)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Published {target} ({target.stat().st_size / 1024 / 1024:.1f} MiB) in {time.monotonic() - start:.2f}s"
+        ))
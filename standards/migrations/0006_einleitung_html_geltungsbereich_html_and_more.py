@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('standards', '0005_vorgabe_relevanz'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='einleitung',
+            name='html',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='geltungsbereich',
+            name='html',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='vorgabekurztext',
+            name='html',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='vorgabelangtext',
+            name='html',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+    ]
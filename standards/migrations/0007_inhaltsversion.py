@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:14
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def create_versions(apps, schema_editor):
+    Standard = apps.get_model('standards', 'Standard')
+    Inhaltsversion = apps.get_model('standards', 'Inhaltsversion')
+    now = timezone.now()
+    Inhaltsversion.objects.bulk_create(
+        [Inhaltsversion(schluessel='standard:%s' % nummer, geaendert=now)
+         for nummer in Standard.objects.values_list('nummer', flat=True)],
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('standards', '0006_einleitung_html_geltungsbereich_html_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Inhaltsversion',
+            fields=[
+                ('schluessel', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('geaendert', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name_plural': 'Inhaltsversionen',
+            },
+        ),
+        migrations.RunPython(create_versions, migrations.RunPython.noop),
+    ]
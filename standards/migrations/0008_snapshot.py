@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('standards', '0007_inhaltsversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Snapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stichtag', models.DateField()),
+                ('version', models.DateTimeField()),
+                ('html', models.TextField()),
+                ('standard', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='standards.standard')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('standard', 'stichtag', 'version'), name='unique_snapshot')],
+            },
+        ),
+    ]
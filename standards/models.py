@@ -51,6 +51,30 @@ class Standard(models.Model):
         verbose_name_plural="Standards"
         verbose_name="Standard"
 
+class VorgabeQuerySet(models.QuerySet):
+    """Validity checks of Vorgabe.get_status, evaluated in the database."""
+
+    @staticmethod
+    def _active_q(check_date):
+        return models.Q(gueltigkeit_von__lte=check_date) & (
+            models.Q(gueltigkeit_bis__isnull=True) | models.Q(gueltigkeit_bis__gt=check_date)
+        )
+
+    def active_on(self, check_date=None):
+        """Vorgaben in force on check_date (default: today)."""
+        return self.filter(self._active_q(check_date or datetime.date.today()))
+
+    def annotate_status(self, check_date=None):
+        """Adds status ("future", "active" or "expired") as of check_date (default: today)."""
+        check_date = check_date or datetime.date.today()
+        return self.annotate(status=models.Case(
+            models.When(gueltigkeit_von__gt=check_date, then=models.Value("future")),
+            models.When(self._active_q(check_date), then=models.Value("active")),
+            default=models.Value("expired"),
+            output_field=models.CharField(),
+        ))
+
+
 class Vorgabe(models.Model):
     nummer = models.IntegerField()
     dokument = models.ForeignKey(Standard, on_delete=models.CASCADE, related_name='vorgaben')
@@ -62,10 +86,14 @@ class Vorgabe(models.Model):
     stichworte = models.ManyToManyField(Stichwort, blank=True)
     relevanz = models.ManyToManyField(Rolle,blank=True)
 
+    objects = VorgabeQuerySet.as_manager()
+
     def Vorgabennummer(self):
         return str(self.dokument.nummer)+"."+self.thema.name[0]+"."+str(self.nummer)
 
-    def get_status(self, check_date: datetime.date = datetime.date.today(), verbose: bool = False) -> str:
+    def get_status(self, check_date: datetime.date = None, verbose: bool = False) -> str:
+        if check_date is None:
+            check_date = datetime.date.today()
         if self.gueltigkeit_von > check_date:
             return "future" if not verbose else "Ist erst ab dem "+self.gueltigkeit_von.strftime('%d.%m.%Y')+" in Kraft."
 
@@ -126,3 +154,37 @@ class Changelog(models.Model):
 
     def __str__(self):
         return f"{self.datum} – {self.dokument.nummer}"
+
+class Inhaltsversion(models.Model):
+    """
+    Time of the last change of a piece of published content (e.g. "standard:<nummer>").
+    Bumped by the signals in standards.signals; used as cache key and for ETags.
+    """
+    schluessel = models.CharField(max_length=255, primary_key=True)
+    geaendert = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.schluessel} ({self.geaendert})"
+
+    class Meta:
+        verbose_name_plural="Inhaltsversionen"
+
+class Snapshot(models.Model):
+    """
+    Rendered history view of a Standard as of a validity boundary (a
+    gueltigkeit_von/bis date of its Vorgaben). The status of every Vorgabe is
+    the same on all days up to the next boundary, so one snapshot serves them
+    all. version is the Inhaltsversion the snapshot was rendered from.
+    """
+    standard = models.ForeignKey(Standard, on_delete=models.CASCADE, related_name='snapshots')
+    stichtag = models.DateField()
+    version = models.DateTimeField()
+    html = models.TextField()
+
+    def __str__(self):
+        return f"{self.standard_id} per {self.stichtag}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['standard', 'stichtag', 'version'], name='unique_snapshot'),
+        ]
@@ -0,0 +1,183 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+
+from referenzen.models import Referenz, Referenzerklaerung
+from rollen.models import Rolle, RollenBeschreibung
+from stichworte.models import Stichwort, Stichworterklaerung
+from .models import (
+    Checklistenfrage,
+    Einleitung,
+    Geltungsbereich,
+    Inhaltsversion,
+    Standard,
+    Vorgabe,
+    VorgabeKurztext,
+    VorgabeLangtext,
+)
+from . import suchindex
+from .utils import VERZEICHNIS_KEY, bump_versions, standard_key
+
+
+def bump_standards(nummern):
+    bump_versions(standard_key(n) for n in nummern if n is not None)
+
+
+def standards_of_vorgaben(vorgabe_ids):
+    return Vorgabe.objects.filter(pk__in=vorgabe_ids).values_list("dokument_id", flat=True)
+
+
+def standard_changed(sender, instance, **kwargs):
+    bump_standards([instance.pk])
+
+
+def standard_deleted(sender, instance, **kwargs):
+    Inhaltsversion.objects.filter(schluessel=standard_key(instance.pk)).delete()
+
+
+def vorgabe_saving(sender, instance, **kwargs):
+    # A Vorgabe moved to another Standard changes the page of the old one, too.
+    if not instance._state.adding:
+        instance._alter_dokument_id = standards_of_vorgaben([instance.pk]).first()
+
+
+def vorgabe_changed(sender, instance, **kwargs):
+    bump_standards([instance.dokument_id, getattr(instance, "_alter_dokument_id", None)])
+
+
+def standard_abschnitt_changed(sender, instance, **kwargs):
+    bump_standards([instance.geltungsbereich_id if sender is Geltungsbereich else instance.einleitung_id])
+
+
+def vorgabe_abschnitt_changed(sender, instance, **kwargs):
+    vorgabe_id = instance.vorgabe_id if sender is Checklistenfrage else instance.abschnitt_id
+    bump_standards(standards_of_vorgaben([vorgabe_id]))
+
+
+def referenz_changed(sender, instance, **kwargs):
+    # The path of a reference contains all its ancestors, so Vorgaben citing
+    # any node below the changed one are affected as well.
+    subtree = instance.get_descendants(include_self=True)
+    bump_standards(Vorgabe.objects.filter(referenzen__in=subtree).values_list("dokument_id", flat=True))
+
+
+def stichwort_changed(sender, instance, **kwargs):
+    bump_standards(instance.vorgabe_set.values_list("dokument_id", flat=True))
+
+
+def verzeichnis_changed(sender, instance, **kwargs):
+    bump_versions([VERZEICHNIS_KEY])
+
+
+def vorgabe_m2m_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if not reverse:
+        bump_standards([instance.dokument_id])
+    elif action == "pre_clear":
+        bump_standards(instance.vorgabe_set.values_list("dokument_id", flat=True))
+    else:
+        bump_standards(standards_of_vorgaben(pk_set))
+
+
+def standard_m2m_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if not reverse:
+        bump_standards([instance.pk])
+    elif action == "pre_clear":
+        bump_standards(sender.objects.filter(person=instance).values_list("standard_id", flat=True))
+    else:
+        bump_standards(pk_set)
+
+
+def abschnitt_saved_suchindex(sender, instance, **kwargs):
+    suchindex.index_abschnitte(sender, [instance])
+
+
+def abschnitt_deleted_suchindex(sender, instance, **kwargs):
+    suchindex.remove_abschnitte(sender, [instance.pk])
+
+
+def vorgabe_saved_suchindex(sender, instance, **kwargs):
+    suchindex.index_vorgaben([instance.pk])
+
+
+def vorgabe_deleted_suchindex(sender, instance, **kwargs):
+    suchindex.remove_vorgaben([instance.pk])
+
+
+def verweis_changed_suchindex(sender, instance, **kwargs):
+    if sender is Referenz:
+        vorgaben = Vorgabe.objects.filter(referenzen__in=instance.get_descendants(include_self=True))
+    else:
+        vorgaben = instance.vorgabe_set.all()
+    suchindex.index_vorgaben(list(vorgaben.values_list("pk", flat=True)))
+
+
+def verweis_deleted_suchindex(sender, instance, **kwargs):
+    # Runs after the delete, when the Vorgabe links are gone already.
+    suchindex.index_vorgaben(instance._suchindex_vorgaben)
+
+
+def verweis_deleting_suchindex(sender, instance, **kwargs):
+    if sender is Referenz:
+        # the paths below a deleted Referenz change, too (see referenzen.models)
+        vorgaben = Vorgabe.objects.filter(referenzen__in=instance.get_descendants(include_self=True)).distinct()
+    else:
+        vorgaben = instance.vorgabe_set.all()
+    instance._suchindex_vorgaben = list(vorgaben.values_list("pk", flat=True))
+
+
+def vorgabe_m2m_changed_suchindex(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        suchindex.index_vorgaben([instance.pk])
+    elif action == "post_clear":
+        suchindex.index_vorgaben(instance._suchindex_vorgaben)
+    else:
+        suchindex.index_vorgaben(pk_set)
+
+
+def vorgabe_m2m_clearing_suchindex(sender, instance, action, reverse, **kwargs):
+    if action == "pre_clear" and reverse:
+        instance._suchindex_vorgaben = list(instance.vorgabe_set.values_list("pk", flat=True))
+
+
+def connect():
+    post_save.connect(standard_changed, sender=Standard)
+    post_delete.connect(standard_deleted, sender=Standard)
+    pre_save.connect(vorgabe_saving, sender=Vorgabe)
+    for signal in (post_save, post_delete):
+        signal.connect(vorgabe_changed, sender=Vorgabe)
+        for model in (Geltungsbereich, Einleitung):
+            signal.connect(standard_abschnitt_changed, sender=model)
+        for model in (VorgabeKurztext, VorgabeLangtext, Checklistenfrage):
+            signal.connect(vorgabe_abschnitt_changed, sender=model)
+
+    # Referenz and Stichwort lose their Vorgabe links when deleted, so they
+    # are handled before the delete.
+    for signal in (post_save, pre_delete):
+        signal.connect(referenz_changed, sender=Referenz)
+        signal.connect(stichwort_changed, sender=Stichwort)
+    for signal in (post_save, post_delete):
+        for model in (Referenz, Referenzerklaerung, Stichwort, Stichworterklaerung, Rolle, RollenBeschreibung):
+            signal.connect(verzeichnis_changed, sender=model)
+
+    for through in (Vorgabe.referenzen.through, Vorgabe.stichworte.through, Vorgabe.relevanz.through):
+        m2m_changed.connect(vorgabe_m2m_changed, sender=through)
+    for through in (Standard.autoren.through, Standard.pruefende.through):
+        m2m_changed.connect(standard_m2m_changed, sender=through)
+
+    # Search index
+    for model in suchindex.ABSCHNITT_BEREICHE:
+        post_save.connect(abschnitt_saved_suchindex, sender=model)
+        post_delete.connect(abschnitt_deleted_suchindex, sender=model)
+    post_save.connect(vorgabe_saved_suchindex, sender=Vorgabe)
+    post_delete.connect(vorgabe_deleted_suchindex, sender=Vorgabe)
+    for model in (Referenz, Stichwort):
+        post_save.connect(verweis_changed_suchindex, sender=model)
+        pre_delete.connect(verweis_deleting_suchindex, sender=model)
+        post_delete.connect(verweis_deleted_suchindex, sender=model)
+    for through in (Vorgabe.referenzen.through, Vorgabe.stichworte.through):
+        m2m_changed.connect(vorgabe_m2m_clearing_suchindex, sender=through)
+        m2m_changed.connect(vorgabe_m2m_changed_suchindex, sender=through)
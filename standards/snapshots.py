@@ -0,0 +1,88 @@
+"""
+Immutable, materialized renderings of the history view of a Standard.
+
+A Snapshot is stored per Standard, validity boundary and content version, so
+the history view for any date is a lookup of the boundary plus one row.
+"""
+import datetime
+
+from django.db import DatabaseError, transaction
+from django.db.models import Max, Q
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from VorgabenUI.db import reads_published
+from .models import Snapshot, Vorgabe
+from .utils import get_version, load_standard_detail, standard_key
+
+# Boundary used for dates before the first gueltigkeit_von of a Standard.
+ANFANG = datetime.date.min
+
+
+def boundaries(standard):
+    """All dates on which the status of a Vorgabe of standard changes."""
+    daten = set()
+    for von, bis in Vorgabe.objects.filter(dokument=standard).values_list("gueltigkeit_von", "gueltigkeit_bis").distinct():
+        daten.add(von)
+        if bis:
+            daten.add(bis)
+    return sorted(daten)
+
+
+def snapshot_date(standard, check_date):
+    """The last boundary on or before check_date (ANFANG if there is none)."""
+    grenzen = Vorgabe.objects.filter(dokument=standard).aggregate(
+        von=Max("gueltigkeit_von", filter=Q(gueltigkeit_von__lte=check_date)),
+        bis=Max("gueltigkeit_bis", filter=Q(gueltigkeit_bis__lte=check_date)),
+    )
+    return max((d for d in grenzen.values() if d), default=ANFANG)
+
+
+def render_snapshot(standard, stichtag):
+    standard.history = True
+    vorgaben = load_standard_detail(standard, stichtag)
+    return render_to_string("standards/standard_detail_inhalt.html", {"standard": standard, "vorgaben": vorgaben})
+
+
+def get_snapshot(standard, check_date):
+    """
+    Returns the rendered history content of standard for check_date, from a
+    stored Snapshot if there is one for the current content version.
+    """
+    stichtag = snapshot_date(standard, check_date)
+    version = get_version(standard_key(standard.nummer))
+    if version is None:
+        return render_snapshot(standard, stichtag)
+
+    html = Snapshot.objects.filter(standard=standard, stichtag=stichtag, version=version).values_list("html", flat=True).first()
+    if html is None:
+        html = render_snapshot(standard, stichtag)
+        if reads_published():
+            # rendered from the published copy, not from the database written to
+            return mark_safe(html)
+        try:
+            with transaction.atomic():
+                store_snapshot(standard, stichtag, version, html)
+        except DatabaseError:
+            # read-only database: serve the rendering without storing it
+            pass
+    return mark_safe(html)
+
+
+def store_snapshot(standard, stichtag, version, html):
+    Snapshot.objects.get_or_create(standard=standard, stichtag=stichtag, version=version, defaults={"html": html})
+    # snapshots of older content versions are never served again
+    Snapshot.objects.filter(standard=standard).exclude(version=version).delete()
+
+
+def build_snapshots(standard):
+    """Materializes the snapshots of all boundaries of standard. Returns their number."""
+    version = get_version(standard_key(standard.nummer))
+    if version is None:
+        return 0
+    vorhanden = set(Snapshot.objects.filter(standard=standard, version=version).values_list("stichtag", flat=True))
+    stichtage = [ANFANG] + boundaries(standard)
+    for stichtag in stichtage:
+        if stichtag not in vorhanden:
+            store_snapshot(standard, stichtag, version, render_snapshot(standard, stichtag))
+    return len(stichtage)
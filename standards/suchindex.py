@@ -0,0 +1,191 @@
+"""
+Full-text search index over the published content, backed by an SQLite FTS5
+table. Each row is one searchable piece of text:
+
+    bereich          objekt_id       vorgabe_id   standard_id
+    kurztext         VorgabeKurztext Vorgabe      Standard
+    langtext         VorgabeLangtext Vorgabe      Standard
+    titel            Vorgabe         Vorgabe      Standard
+    stichworte       Vorgabe         Vorgabe      Standard
+    referenzen       Vorgabe         Vorgabe      Standard
+    geltungsbereich  Geltungsbereich NULL         Standard
+    einleitung       Einleitung      NULL         Standard
+
+The index is kept up to date by standards.signals and can be rebuilt with the
+rebuild-search-index command.
+"""
+from collections import namedtuple
+import datetime
+import re
+
+from django.db import connection, connections, router
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from referenzen.utils import referenz_pfade
+from .models import Einleitung, Geltungsbereich, Vorgabe, VorgabeKurztext, VorgabeLangtext
+
+TABLE = "standards_suchindex"
+
+# unicode61 folds case and diacritics (ä -> a), so "Änderung" also finds
+# "anderung" and vice versa. Queries match word prefixes, which covers German
+# inflections and compound words starting with the search term.
+CREATE_TABLE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS " + TABLE + " USING fts5("
+    "inhalt, bereich UNINDEXED, objekt_id UNINDEXED, vorgabe_id UNINDEXED, standard_id UNINDEXED, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+)
+
+ABSCHNITT_BEREICHE = {
+    VorgabeKurztext: "kurztext",
+    VorgabeLangtext: "langtext",
+    Geltungsbereich: "geltungsbereich",
+    Einleitung: "einleitung",
+}
+VORGABE_BEREICHE = ("titel", "stichworte", "referenzen")
+BATCH_SIZE = 500
+SNIPPET_WOERTER = 24
+SNIPPET_START = "\x02"
+SNIPPET_ENDE = "\x03"
+
+
+def create_table(using="default", **kwargs):
+    with connections[using].cursor() as cursor:
+        cursor.execute(CREATE_TABLE)
+
+
+def _remove(cursor, bereiche, ids):
+    ids = list(ids)
+    if not ids:
+        return
+    cursor.execute(
+        "DELETE FROM %s WHERE bereich IN (%s) AND objekt_id IN (%s)"
+        % (TABLE, ",".join(["%s"] * len(bereiche)), ",".join(["%s"] * len(ids))),
+        [*bereiche, *ids],
+    )
+
+
+def _insert(cursor, rows):
+    if rows:
+        cursor.executemany(
+            "INSERT INTO %s (inhalt, bereich, objekt_id, vorgabe_id, standard_id) VALUES (%%s, %%s, %%s, %%s, %%s)" % TABLE,
+            rows,
+        )
+
+
+def index_abschnitte(model, abschnitte):
+    """(Re)indexes the given text sections of one Textabschnitt model."""
+    bereich = ABSCHNITT_BEREICHE[model]
+    abschnitte = list(abschnitte)
+    rows = []
+    if model in (VorgabeKurztext, VorgabeLangtext):
+        standards = dict(
+            Vorgabe.objects.filter(pk__in={a.abschnitt_id for a in abschnitte}).values_list("pk", "dokument_id")
+        )
+        for a in abschnitte:
+            rows.append((a.inhalt or "", bereich, a.pk, a.abschnitt_id, standards.get(a.abschnitt_id)))
+    else:
+        fk = "geltungsbereich_id" if model is Geltungsbereich else "einleitung_id"
+        for a in abschnitte:
+            rows.append((a.inhalt or "", bereich, a.pk, None, getattr(a, fk)))
+    with connection.cursor() as cursor:
+        _remove(cursor, [bereich], [a.pk for a in abschnitte])
+        _insert(cursor, rows)
+
+
+def remove_abschnitte(model, ids):
+    with connection.cursor() as cursor:
+        _remove(cursor, [ABSCHNITT_BEREICHE[model]], ids)
+
+
+def index_vorgaben(vorgabe_ids):
+    """(Re)indexes title, keywords and reference paths of the given Vorgaben."""
+    vorgaben = list(Vorgabe.objects.filter(pk__in=list(vorgabe_ids)).prefetch_related("stichworte", "referenzen"))
+    pfade = referenz_pfade(r for v in vorgaben for r in v.referenzen.all())
+    rows = []
+    for v in vorgaben:
+        rows.append((v.titel, "titel", v.pk, v.pk, v.dokument_id))
+        stichworte = ", ".join(s.stichwort for s in v.stichworte.all())
+        if stichworte:
+            rows.append((stichworte, "stichworte", v.pk, v.pk, v.dokument_id))
+        referenzen = ", ".join(pfade[r.id] for r in v.referenzen.all())
+        if referenzen:
+            rows.append((referenzen, "referenzen", v.pk, v.pk, v.dokument_id))
+    with connection.cursor() as cursor:
+        _remove(cursor, VORGABE_BEREICHE, [v.pk for v in vorgaben])
+        _insert(cursor, rows)
+
+
+def remove_vorgaben(ids):
+    with connection.cursor() as cursor:
+        _remove(cursor, VORGABE_BEREICHE, ids)
+
+
+def _chunks(iterable, size=BATCH_SIZE):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def rebuild():
+    """Rebuilds the whole index from scratch. Returns the number of rows."""
+    with connection.cursor() as cursor:
+        cursor.execute(CREATE_TABLE)
+        cursor.execute("DELETE FROM %s" % TABLE)
+    for model in ABSCHNITT_BEREICHE:
+        for chunk in _chunks(model.objects.iterator(chunk_size=BATCH_SIZE)):
+            index_abschnitte(model, chunk)
+    for chunk in _chunks(Vorgabe.objects.values_list("pk", flat=True).iterator(chunk_size=BATCH_SIZE)):
+        index_vorgaben(chunk)
+    with connection.cursor() as cursor:
+        cursor.execute("INSERT INTO %s(%s) VALUES ('optimize')" % (TABLE, TABLE))
+        cursor.execute("SELECT count(*) FROM %s" % TABLE)
+        return cursor.fetchone()[0]
+
+
+def match_expression(suchbegriff):
+    """
+    Turns free text into an FTS5 query: every word must occur as a word
+    prefix (single letters as whole words). Quoting the words keeps FTS5
+    operators in the input literal.
+    """
+    woerter = re.findall(r"\w+", suchbegriff or "")
+    return " ".join(('"%s"*' if len(w) > 1 else '"%s"') % w for w in woerter)
+
+
+Treffer = namedtuple("Treffer", "bereich objekt_id vorgabe_id standard_id snippet")
+
+
+def _snippet_html(text):
+    return mark_safe(escape(text).replace(SNIPPET_START, "<mark>").replace(SNIPPET_ENDE, "</mark>"))
+
+
+def search(suchbegriff, bereiche, limit=None, offset=0):
+    """
+    Returns Treffer for the index rows in the given bereiche matching
+    suchbegriff, best (BM25) first. Rows of Vorgaben not in force today are
+    left out (same rule as VorgabeQuerySet.active_on). snippet is an HTML excerpt with the matches in <mark>.
+    limit and offset page through the hits inside the database.
+    """
+    ausdruck = match_expression(suchbegriff)
+    bereiche = list(bereiche)
+    if not ausdruck or not bereiche:
+        return []
+    stichtag = datetime.date.today()
+    with connections[router.db_for_read(Vorgabe)].cursor() as cursor:
+        cursor.execute(
+            "SELECT %(t)s.bereich, objekt_id, vorgabe_id, standard_id, "
+            "snippet(%(t)s, 0, char(2), char(3), '…', %(w)d) "
+            "FROM %(t)s LEFT JOIN standards_vorgabe v ON v.id = vorgabe_id "
+            "WHERE %(t)s MATCH %%s AND %(t)s.bereich IN (%(b)s) "
+            "AND (v.id IS NULL OR (v.gueltigkeit_von <= %%s AND (v.gueltigkeit_bis IS NULL OR v.gueltigkeit_bis > %%s))) "
+            "ORDER BY %(t)s.rank LIMIT %%s OFFSET %%s"
+            % {"t": TABLE, "w": SNIPPET_WOERTER, "b": ",".join(["%s"] * len(bereiche))},
+            [ausdruck, *bereiche, stichtag, stichtag, -1 if limit is None else limit, offset],
+        )
+        return [Treffer(*row[:4], _snippet_html(row[4])) for row in cursor.fetchall()]
@@ -1,3 +1,394 @@
-from django.test import TestCase
+from datetime import date
+from io import BytesIO, StringIO
+from unittest import mock
+from pathlib import Path
+from xml.etree import ElementTree
+import csv
+import os
+import sqlite3
+import tempfile
+import zipfile
 
-# Create your tests here.
+from django.core.management import CommandError, call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from abschnitte.models import AbschnittTyp
+from referenzen.models import Referenz
+from rollen.models import Rolle
+from stichworte.models import Stichwort
+from . import snapshots
+from .importer import SyncError, iter_blocks, iter_records, sync_standard
+from .models import (
+    Checklistenfrage,
+    Dokumententyp,
+    Einleitung,
+    Geltungsbereich,
+    Person,
+    Snapshot,
+    Standard,
+    Thema,
+    Vorgabe,
+    VorgabeKurztext,
+    VorgabeLangtext,
+)
+
+
+# The readonly alias is a separate connection that cannot see the data of the
+# test transaction, so reads stay on default here.
+@override_settings(DATABASE_ROUTERS=[])
+class InhaltTestCase(TestCase):
+    """Standards whose Vorgaben use every kind of related content."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.text = AbschnittTyp.objects.create(abschnitttyp="text")
+        cls.thema = Thema.objects.create(name="Technik")
+        cls.person = Person.objects.create(name="Muster", funktion="Autor")
+        cls.rolle = Rolle.objects.create(name="Betrieb")
+        cls.stichwort = Stichwort.objects.create(stichwort="Container")
+        cls.wurzel = Referenz.objects.create(name_nummer="ISO 27001")
+        cls.kapitel = Referenz.objects.create(name_nummer="A.8", oberreferenz=cls.wurzel)
+        cls.dokumententyp = Dokumententyp.objects.create(name="IT-Sicherheit", verantwortliche_ve="SI")
+
+    def make_standard(self, nummer, anzahl_vorgaben):
+        standard = Standard.objects.create(nummer=nummer, dokumententyp=self.dokumententyp, name=nummer)
+        standard.autoren.add(self.person)
+        standard.pruefende.add(self.person)
+        Einleitung.objects.create(einleitung=standard, abschnitttyp=self.text, inhalt="Einleitung")
+        Geltungsbereich.objects.create(geltungsbereich=standard, abschnitttyp=self.text, inhalt="Alle Systeme")
+        for i in range(anzahl_vorgaben):
+            referenz = Referenz.objects.create(name_nummer="A.8.%d" % i, oberreferenz=self.kapitel)
+            vorgabe = Vorgabe.objects.create(
+                nummer=i, dokument=standard, thema=self.thema, titel="Vorgabe %d" % i,
+                gueltigkeit_von=date(2020, 1, 1),
+            )
+            vorgabe.referenzen.add(referenz, self.wurzel)
+            vorgabe.stichworte.add(self.stichwort)
+            vorgabe.relevanz.add(self.rolle)
+            VorgabeKurztext.objects.create(abschnitt=vorgabe, abschnitttyp=self.text, inhalt="Kurz")
+            VorgabeLangtext.objects.create(abschnitt=vorgabe, abschnitttyp=self.text, inhalt="Lang 1", order=1)
+            VorgabeLangtext.objects.create(abschnitt=vorgabe, abschnitttyp=self.text, inhalt="Lang 2", order=2)
+            Checklistenfrage.objects.create(vorgabe=vorgabe, frage="Erfüllt?")
+        return standard
+
+
+class StandardDetailQueryTest(InhaltTestCase):
+    """standard_detail must not issue queries per Vorgabe or per Referenz."""
+
+    def test_query_count_is_constant(self):
+        # 12 queries to render (Referenz paths are stored) plus the content version lookup of the page cache.
+        self.make_standard("KLEIN", 1)
+        self.make_standard("GROSS", 20)
+
+        with self.assertNumQueries(13):
+            response = self.client.get("/standards/KLEIN/")
+        self.assertEqual(response.status_code, 200)
+
+        with self.assertNumQueries(13):
+            response = self.client.get("/standards/GROSS/")
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "ISO 27001 → A.8 → A.8.19")
+        self.assertContains(response, "<p>Lang 2</p>")
+
+
+class StandardPageCacheTest(InhaltTestCase):
+    """Standard pages are answered with 304 until their content version changes."""
+
+    def test_etag_changes_with_content(self):
+        standard = self.make_standard("KLEIN", 1)
+        erste = self.client.get("/standards/KLEIN/")
+        self.assertEqual(erste.status_code, 200)
+        response = self.client.get("/standards/KLEIN/", HTTP_IF_NONE_MATCH=erste["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+        vorgabe = standard.vorgaben.get()
+        vorgabe.titel = "Neuer Titel"
+        vorgabe.save()
+        response = self.client.get("/standards/KLEIN/", HTTP_IF_NONE_MATCH=erste["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], erste["ETag"])
+        self.assertContains(response, "Neuer Titel")
+
+    def test_moved_vorgabe_changes_both_standards(self):
+        alt = self.make_standard("ALT", 1)
+        neu = self.make_standard("NEU", 0)
+        etags = {n: self.client.get("/standards/%s/" % n)["ETag"] for n in ("ALT", "NEU")}
+
+        vorgabe = alt.vorgaben.get()
+        vorgabe.dokument = neu
+        vorgabe.save()
+        for nummer, etag in etags.items():
+            response = self.client.get("/standards/%s/" % nummer, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200, nummer)
+
+
+IMPORT_TEXT = """\
+>>>Einleitung
+>>>Text
+Diese Vorgaben gelten für Container.
+>>>Geltungsbereich
+>>>Liste ungeordnet
+Kubernetes
+OpenShift
+>>>Vorgabe Technik
+>>>Nummer 1
+>>>Titel
+Images signieren
+>>>Kurztext
+>>>Text
+Images müssen signiert sein.
+>>>Langtext
+>>>Text
+Nur signierte Images dürfen laufen.
+>>>Stichworte Container, Supply Chain
+>>>Checkliste
+Werden Signaturen geprüft?
+>>>Vorgabe Technik
+>>>Nummer 2
+>>>Titel Keine Root-Container
+>>>Kurztext
+>>>Text
+Container laufen nicht als root.
+"""
+
+
+
+class SnapshotTest(InhaltTestCase):
+    """History views are served from the snapshot of the last validity boundary."""
+
+    def setUp(self):
+        self.standard = self.make_standard("KLEIN", 2)
+        # Vorgabe 1 expires at the end of 2020
+        vorgabe = self.standard.vorgaben.get(nummer=1)
+        vorgabe.gueltigkeit_bis = date(2020, 12, 31)
+        vorgabe.save()
+
+    def test_snapshot_date(self):
+        self.assertEqual(snapshots.boundaries(self.standard), [date(2020, 1, 1), date(2020, 12, 31)])
+        for tag, grenze in (
+            (date(2019, 12, 31), snapshots.ANFANG),
+            (date(2020, 1, 1), date(2020, 1, 1)),
+            (date(2020, 6, 1), date(2020, 1, 1)),
+            (date(2020, 12, 31), date(2020, 12, 31)),
+            (date(2030, 1, 1), date(2020, 12, 31)),
+        ):
+            with self.subTest(tag=tag):
+                self.assertEqual(snapshots.snapshot_date(self.standard, tag), grenze)
+
+    def test_build_and_invalidate(self):
+        out = StringIO()
+        call_command("build-snapshots", "KLEIN", stdout=out)
+        self.assertIn("KLEIN: 3 Snapshots", out.getvalue())
+        stichtage = sorted(Snapshot.objects.filter(standard=self.standard).values_list("stichtag", flat=True))
+        self.assertEqual(stichtage, [snapshots.ANFANG, date(2020, 1, 1), date(2020, 12, 31)])
+        with self.assertNumQueries(3):
+            html = snapshots.get_snapshot(self.standard, date(2020, 6, 1))
+        self.assertIn("Vorgabe 1", html)
+        self.assertNotIn("nicht mehr in Kraft", html)
+        self.assertIn("Ist seit dem 31.12.2020 nicht mehr in Kraft", snapshots.get_snapshot(self.standard, date(2021, 6, 1)))
+
+        vorgabe = self.standard.vorgaben.get(nummer=0)
+        vorgabe.titel = "Geändert"
+        vorgabe.save()
+        self.assertIn("Geändert", snapshots.get_snapshot(self.standard, date(2020, 6, 1)))
+        # only the new rendering is left
+        self.assertEqual(list(Snapshot.objects.filter(standard=self.standard).values_list("stichtag", flat=True)),
+                         [date(2020, 1, 1)])
+        with self.assertRaises(CommandError):
+            call_command("build-snapshots", "UNBEKANNT", stdout=StringIO())
+
+
+class ImportTest(InhaltTestCase):
+    """All write paths of import-standard produce the same content."""
+
+    def setUp(self):
+        AbschnittTyp.objects.create(abschnitttyp="liste ungeordnet")
+        verzeichnis = tempfile.TemporaryDirectory()
+        self.addCleanup(verzeichnis.cleanup)
+        self.verzeichnis = Path(verzeichnis.name)
+
+    def datei(self, name, text=IMPORT_TEXT):
+        pfad = self.verzeichnis / name
+        pfad.write_text(text, encoding="utf-8")
+        return pfad
+
+    def importiere(self, nummer, *args):
+        call_command(
+            "import-standard", str(self.datei(nummer + ".txt")), "--nummer", nummer, "--name", nummer,
+            "--dokumententyp", self.dokumententyp.name, *args, stdout=StringIO(),
+        )
+
+    def inhalt(self, nummer):
+        standard = Standard.objects.get(nummer=nummer)
+        abschnitte = lambda qs: list(qs.order_by("order", "pk").values_list("abschnitttyp", "inhalt", "html"))
+        return {
+            "einleitung": abschnitte(standard.einleitung_set),
+            "geltungsbereich": abschnitte(standard.geltungsbereich_set),
+            "vorgaben": [
+                (v.thema_id, v.nummer, v.titel, abschnitte(v.vorgabekurztext_set), abschnitte(v.vorgabelangtext_set),
+                 sorted(v.stichworte.values_list("stichwort", flat=True)),
+                 list(v.checklistenfragen.order_by("pk").values_list("frage", flat=True)))
+                for v in standard.vorgaben.order_by("nummer")
+            ],
+        }
+
+    def test_modes_write_the_same_rows(self):
+        self.importiere("EINZELN")
+        self.importiere("BULK", "--bulk")
+        self.importiere("SYNC", "--sync")
+        erwartet = self.inhalt("EINZELN")
+        self.assertEqual(len(erwartet["vorgaben"]), 2)
+        self.assertEqual(erwartet["vorgaben"][0][5], ["Container", "Supply Chain"])
+        self.assertIn("<li>OpenShift</li>", erwartet["geltungsbereich"][0][2])
+        self.assertEqual(self.inhalt("BULK"), erwartet)
+        self.assertEqual(self.inhalt("SYNC"), erwartet)
+
+    def test_sync_writes_only_differences(self):
+        self.importiere("SYNC", "--bulk")
+        standard = Standard.objects.get(nummer="SYNC")
+        ids = dict(standard.vorgaben.values_list("nummer", "pk"))
+
+        text = IMPORT_TEXT.replace("Images signieren", "Nur signierte Images").replace("Nummer 2", "Nummer 3")
+        summary = sync_standard(standard, iter_records(iter_blocks(text.splitlines(keepends=True))))
+        self.assertEqual((summary["inserted"], summary["updated"], summary["deleted"], summary["unchanged"]), (1, 1, 1, 0))
+        self.assertEqual(standard.vorgaben.get(nummer=1).pk, ids[1])
+        self.assertEqual(standard.vorgaben.get(nummer=1).titel, "Nur signierte Images")
+        self.assertEqual(sorted(standard.vorgaben.values_list("nummer", flat=True)), [1, 3])
+
+        summary = sync_standard(standard, iter_records(iter_blocks(text.splitlines(keepends=True))))
+        self.assertEqual((summary["unchanged"], summary["rows"]), (2, 0))
+
+    def test_sync_refuses_duplicate_numbers(self):
+        self.importiere("SYNC", "--bulk")
+        standard = Standard.objects.get(nummer="SYNC")
+        zweite = Vorgabe.objects.create(
+            nummer=1, dokument=standard, thema=self.thema, titel="Zweite Version", gueltigkeit_von=date(2099, 1, 1),
+        )
+        with self.assertRaisesMessage(SyncError, "Technik 1"):
+            sync_standard(standard, iter_records(iter_blocks(IMPORT_TEXT.splitlines(keepends=True))))
+        with self.assertRaisesMessage(CommandError, "Several Vorgaben in force share a number"):
+            self.importiere("SYNC", "--sync")
+        self.assertEqual(standard.vorgaben.filter(nummer=1).count(), 2)
+
+        # once one of them has ended, the other is matched
+        zweite.gueltigkeit_von, zweite.gueltigkeit_bis = date(2019, 1, 1), date(2020, 1, 1)
+        zweite.save()
+        summary = sync_standard(standard, iter_records(iter_blocks(IMPORT_TEXT.splitlines(keepends=True))))
+        self.assertEqual(summary["unchanged"], 2)
+
+    def test_manifest_commits_the_files_that_work(self):
+        self.datei("a.txt")
+        # a Vorgabe without Nummer fails on insert, after the Einleitung was written
+        self.datei("b.txt", IMPORT_TEXT.replace(">>>Nummer 2\n", ""))
+        self.datei("c.txt")
+        manifest = self.verzeichnis / "manifest.csv"
+        manifest.write_text(
+            "file,nummer,name,dokumententyp\n"
+            + "".join("%s.txt,%s,%s,%s\n" % (n, n.upper(), n, self.dokumententyp.name) for n in "abc"),
+            encoding="utf-8",
+        )
+        with self.assertRaisesMessage(CommandError, "Import failed for: b.txt"):
+            call_command("import-standard", str(self.verzeichnis), "--manifest", str(manifest), "--workers", "2",
+                         stdout=StringIO(), stderr=StringIO())
+        # the Standard and Einleitung of b.txt are rolled back, too
+        self.assertEqual(sorted(Standard.objects.values_list("nummer", flat=True)), ["A", "C"])
+        self.assertEqual(Einleitung.objects.count(), 2)
+        self.assertEqual(self.inhalt("A"), self.inhalt("C"))
+        self.assertEqual(len(self.inhalt("C")["vorgaben"]), 2)
+
+
+class ChecklisteTest(InhaltTestCase):
+    """The checklist across Standards, filtered by Rolle, as CSV and XLSX."""
+
+    def setUp(self):
+        klein = self.make_standard("KLEIN", 2)
+        self.make_standard("GROSS", 1)
+        entwicklung = Rolle.objects.create(name="Entwicklung")
+        vorgabe = Vorgabe.objects.create(
+            nummer=5, dokument=klein, thema=self.thema, titel="Signaturen", gueltigkeit_von=date(2020, 1, 1),
+        )
+        vorgabe.relevanz.add(entwicklung)
+        Checklistenfrage.objects.create(vorgabe=vorgabe, frage="Signiert; geprüft?")
+
+    def csv_zeilen(self, **params):
+        response = self.client.get("/standards/checkliste/", {"format": "csv", **params})
+        text = b"".join(response.streaming_content).decode("utf-8")
+        self.assertTrue(text.startswith("\ufeff"))
+        return list(csv.reader(StringIO(text[1:]), delimiter=";"))
+
+    def test_csv(self):
+        self.assertEqual(self.csv_zeilen(standard="KLEIN"), [
+            ["Standard", "Vorgabe", "Titel", "Frage"],
+            ["KLEIN", "KLEIN.T.0", "Vorgabe 0", "Erfüllt?"],
+            ["KLEIN", "KLEIN.T.1", "Vorgabe 1", "Erfüllt?"],
+            ["KLEIN", "KLEIN.T.5", "Signaturen", "Signiert; geprüft?"],
+        ])
+        self.assertEqual(self.csv_zeilen(rolle="Entwicklung")[1:], [["KLEIN", "KLEIN.T.5", "Signaturen", "Signiert; geprüft?"]])
+        self.assertEqual(len(self.csv_zeilen(rolle="Betrieb")), 4)
+
+    def test_xlsx(self):
+        response = self.client.get("/standards/checkliste/", {"format": "xlsx", "standard": ["KLEIN", "GROSS"]})
+        self.assertEqual(response["Content-Type"], "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+        with zipfile.ZipFile(BytesIO(response.content)) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertIn("[Content_Types].xml", zf.namelist())
+            blatt = ElementTree.fromstring(zf.read("xl/worksheets/sheet1.xml"))
+        ns = {"s": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+        zeilen = [[t.text for t in row.iterfind("s:c/s:is/s:t", ns)] for row in blatt.iterfind("s:sheetData/s:row", ns)]
+        self.assertEqual(zeilen, [
+            ["Standard", "Vorgabe", "Titel", "Frage"],
+            ["GROSS", "GROSS.T.0", "Vorgabe 0", "Erfüllt?"],
+            ["KLEIN", "KLEIN.T.0", "Vorgabe 0", "Erfüllt?"],
+            ["KLEIN", "KLEIN.T.1", "Vorgabe 1", "Erfüllt?"],
+            ["KLEIN", "KLEIN.T.5", "Signaturen", "Signiert; geprüft?"],
+        ])
+
+
+class PublishTest(TransactionTestCase):
+    """publish replaces the published copy in one rename."""
+
+    # the SQLite backup API cannot copy a database with an open write transaction
+
+    def setUp(self):
+        verzeichnis = tempfile.TemporaryDirectory()
+        self.addCleanup(verzeichnis.cleanup)
+        self.verzeichnis = Path(verzeichnis.name)
+        self.ziel = self.verzeichnis / "published.sqlite3"
+        self.dokumententyp = Dokumententyp.objects.create(name="IT-Sicherheit", verantwortliche_ve="SI")
+
+    def make_standard(self, nummer):
+        Standard.objects.create(nummer=nummer, dokumententyp=self.dokumententyp, name=nummer)
+
+    def publish(self):
+        call_command("publish", "--target", str(self.ziel), "--skip-snapshots", stdout=StringIO())
+
+    def nummern(self, verbindung):
+        return [n for n, in verbindung.execute("SELECT nummer FROM standards_standard ORDER BY nummer")]
+
+    def test_swap(self):
+        self.make_standard("ALT")
+        self.publish()
+        alt = sqlite3.connect(self.ziel)
+        self.addCleanup(alt.close)
+        inode = os.stat(self.ziel).st_ino
+
+        self.make_standard("NEU")
+        self.publish()
+        self.assertNotEqual(os.stat(self.ziel).st_ino, inode)
+        # an open reader keeps the copy it opened
+        self.assertEqual(self.nummern(alt), ["ALT"])
+        with sqlite3.connect("file:%s?mode=ro&immutable=1" % self.ziel, uri=True) as neu:
+            self.assertEqual(self.nummern(neu), ["ALT", "NEU"])
+            self.assertEqual(neu.execute("PRAGMA journal_mode").fetchone(), ("delete",))
+        self.assertEqual([p.name for p in self.verzeichnis.iterdir()], ["published.sqlite3"])
+
+    def test_failure_keeps_old_copy(self):
+        self.make_standard("ALT")
+        self.publish()
+        self.make_standard("NEU")
+        with mock.patch("standards.management.commands.publish.os.fsync", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                self.publish()
+        with sqlite3.connect(self.ziel) as alt:
+            self.assertEqual(self.nummern(alt), ["ALT"])
+        self.assertEqual([p.name for p in self.verzeichnis.iterdir()], ["published.sqlite3"])
@@ -0,0 +1,109 @@
+from datetime import date
+
+from django.db.models import F, Prefetch
+from django.utils import timezone
+import parsedatetime
+
+from abschnitte.utils import render_textabschnitte
+from referenzen.utils import referenz_pfade
+from .models import Inhaltsversion, Vorgabe, VorgabeKurztext, VorgabeLangtext
+
+
+calendar = parsedatetime.Calendar()
+
+
+def resolve_check_date(check_date):
+    """Returns (date, history) for the check_date part of a standard or Rolle URL."""
+    if not check_date:
+        return date.today(), False
+    try:
+        return date.fromisoformat(check_date), True
+    except ValueError:
+        return calendar.parseDT(check_date)[0].date(), True
+
+
+def load_vorgaben(queryset):
+    """
+    Loads a queryset of Vorgaben together with everything the standard pages
+    show for them (sections, roles, references, keywords, checklist questions)
+    in a constant number of queries. Each Vorgabe gets referenzpfade attached.
+    """
+    vorgaben = list(
+        queryset.select_related("thema", "dokument").prefetch_related(
+            Prefetch("vorgabekurztext_set", queryset=VorgabeKurztext.objects.order_by("order")),
+            Prefetch("vorgabelangtext_set", queryset=VorgabeLangtext.objects.order_by("order")),
+            "relevanz",
+            "referenzen",
+            "stichworte",
+            "checklistenfragen",
+        )
+    )
+
+    pfade = referenz_pfade(r for vorgabe in vorgaben for r in vorgabe.referenzen.all())
+    for vorgabe in vorgaben:
+        vorgabe.referenzpfade = [pfade[r.id] for r in vorgabe.referenzen.all()]
+    return vorgaben
+
+
+def vorgaben_unter(referenz, check_date=None):
+    """
+    Returns {referenz_id: [Vorgabe, ...]} for referenz and all references
+    below it, in one query. The Vorgaben come with dokument, thema and their
+    status as of check_date (default: today).
+    """
+    index = {}
+    vorgaben = (
+        Vorgabe.objects.filter(
+            referenzen__tree_id=referenz.tree_id,
+            referenzen__lft__gte=referenz.lft,
+            referenzen__rght__lte=referenz.rght,
+        )
+        .annotate(referenz_id=F("referenzen__id"))
+        .annotate_status(check_date)
+        .select_related("dokument", "thema")
+        .order_by("pk")
+    )
+    for vorgabe in vorgaben:
+        index.setdefault(vorgabe.referenz_id, []).append(vorgabe)
+    return index
+
+
+def load_standard_detail(standard, check_date):
+    """
+    Prepares standard for the standard_detail templates as of check_date and
+    returns its Vorgaben. standard.history selects whether Vorgaben not in
+    force on check_date are shown (with their status) or left out.
+    """
+    vorgaben = standard.vorgaben.order_by("thema","nummer")
+    if not standard.history:
+        vorgaben = vorgaben.active_on(check_date)
+    vorgaben = load_vorgaben(vorgaben)
+
+    standard.geltungsbereich_html = render_textabschnitte(standard.geltungsbereich_set.order_by("order"))
+    standard.einleitung_html=render_textabschnitte(standard.einleitung_set.order_by("order"))
+    for vorgabe in vorgaben:
+        vorgabe.kurztext_html = render_textabschnitte(vorgabe.vorgabekurztext_set.all())
+        vorgabe.langtext_html = render_textabschnitte(vorgabe.vorgabelangtext_set.all())
+        vorgabe.long_status=vorgabe.get_status(check_date,verbose=True)
+        vorgabe.relevanzset=list(vorgabe.relevanz.all())
+    return vorgaben
+
+
+def standard_key(nummer):
+    return "standard:%s" % nummer
+
+
+# Version of the Stichwort, Referenz and Rolle pages (names, explanations, tree).
+VERZEICHNIS_KEY = "verzeichnisse"
+
+
+def get_version(schluessel):
+    """Returns the time of the last change of schluessel, or None if unknown."""
+    return Inhaltsversion.objects.filter(schluessel=schluessel).values_list("geaendert", flat=True).first()
+
+
+def bump_versions(schluessel):
+    """Marks the content behind all given keys as changed now."""
+    now = timezone.now()
+    for s in set(schluessel):
+        Inhaltsversion.objects.update_or_create(schluessel=s, defaults={"geaendert": now})
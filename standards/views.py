@@ -1,11 +1,53 @@
+from django.conf import settings
+from django.core.cache import caches, DEFAULT_CACHE_ALIAS
+from django.db import router
+from django.http import HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from .checkliste import XLSX_CONTENT_TYPE, checklistenfragen, csv_stream, xlsx
 from .models import Standard
-from abschnitte.utils import render_textabschnitte
+from .snapshots import get_snapshot
+from .utils import load_standard_detail, get_version, resolve_check_date, standard_key
 
-from datetime import date
-import parsedatetime
+from datetime import datetime, time
+from functools import wraps
 
-calendar=parsedatetime.Calendar()
+
+def cached_standard_page(view):
+    """
+    Caches the rendered page per Standard, resolved check date and content
+    version, and answers conditional requests (ETag/Last-Modified) with 304.
+    Standards without a content version are always rendered.
+    """
+    @wraps(view)
+    def wrapper(request, nummer, check_date=""):
+        version = get_version(standard_key(nummer))
+        if version is None or request.method not in ("GET", "HEAD"):
+            return view(request, nummer, check_date)
+
+        day, history = resolve_check_date(check_date)
+        etag = quote_etag("%s:%s:%s:%s" % (nummer, day.isoformat(), int(history), version.timestamp()))
+        # The status of a Vorgabe changes at midnight without any edit.
+        last_modified = max(version, timezone.make_aware(datetime.combine(day, time.min))).timestamp()
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            cache = caches[getattr(settings, "SEITEN_CACHE", DEFAULT_CACHE_ALIAS)]
+            key = "%s:%s" % (view.__name__, etag)
+            content = cache.get(key)
+            if content is None:
+                response = view(request, nummer, check_date)
+                if response.status_code != 200:
+                    return response
+                cache.set(key, response.content)
+            else:
+                response = HttpResponse(content)
+        response.headers["ETag"] = etag
+        response.headers["Last-Modified"] = http_date(last_modified)
+        return response
+    return wrapper
 
 
 def standard_list(request):
@@ -15,44 +57,61 @@ def standard_list(request):
                   )
 
 
+@cached_standard_page
 def standard_detail(request, nummer,check_date=""):
-    standard = get_object_or_404(Standard, nummer=nummer)
-
-    if check_date:
-        check_date = calendar.parseDT(check_date)[0].date()
-        standard.history = True
-    else:
-        check_date = date.today()
-        standard.history = False
+    check_date, history = resolve_check_date(check_date)
+    standards = Standard.objects if history else Standard.objects.prefetch_related("autoren", "pruefende")
+    standard = get_object_or_404(standards, nummer=nummer)
+    standard.history = history
     standard.check_date=check_date
-    vorgaben = list(standard.vorgaben.order_by("thema","nummer").select_related("thema","dokument"))  # convert queryset to list so we can attach attributes
-
-    standard.geltungsbereich_html = render_textabschnitte(standard.geltungsbereich_set.order_by("order").select_related("abschnitttyp"))
-    standard.einleitung_html=render_textabschnitte(standard.einleitung_set.order_by("order"))
-    for vorgabe in vorgaben:
-        # Prepare Kurztext HTML
-        vorgabe.kurztext_html = render_textabschnitte(vorgabe.vorgabekurztext_set.order_by("order").select_related("abschnitttyp","abschnitt"))
-        vorgabe.langtext_html = render_textabschnitte(vorgabe.vorgabelangtext_set.order_by("order").select_related("abschnitttyp","abschnitt"))
-        vorgabe.long_status=vorgabe.get_status(check_date,verbose=True)
-        vorgabe.relevanzset=list(vorgabe.relevanz.all())
-
-        referenz_items = []
-        for r in vorgabe.referenzen.all():
-            referenz_items.append(r.Path())
-        vorgabe.referenzpfade = referenz_items
+    if standard.history:
+        return render(request, 'standards/standard_detail.html', {
+            'standard': standard,
+            'inhalt': get_snapshot(standard, check_date),
+        })
 
+    vorgaben = load_standard_detail(standard, check_date)
     return render(request, 'standards/standard_detail.html', {
         'standard': standard,
         'vorgaben': vorgaben,
     })
 
 
-def standard_checkliste(request, nummer):
+@cached_standard_page
+def standard_checkliste(request, nummer, check_date=""):
     standard = get_object_or_404(Standard, nummer=nummer)
-    vorgaben = list(standard.vorgaben.all())
     return render(request, 'standards/standard_checkliste.html', {
         'standard': standard,
-        'vorgaben': vorgaben,
+        'fragen': checklistenfragen([standard]),
     })
 
 
+def checkliste(request):
+    """
+    Checklist across Standards: ?standard=<nummer> and ?rolle=<name> may be
+    repeated (default: all Standards, all Rollen), ?format= is html, csv or xlsx.
+    """
+    # CSV is streamed after the routing middleware returned, so the
+    # database is chosen now
+    alias = router.db_for_read(Standard)
+    standards = Standard.objects.using(alias)
+    if request.GET.getlist("standard"):
+        standards = standards.filter(nummer__in=request.GET.getlist("standard"))
+    rollen = request.GET.getlist("rolle")
+    fragen = checklistenfragen(standards, rollen).using(alias)
+
+    fmt = request.GET.get("format", "html")
+    if fmt == "csv":
+        response = StreamingHttpResponse(csv_stream(fragen), content_type="text/csv; charset=utf-8")
+    elif fmt == "xlsx":
+        response = HttpResponse(xlsx(fragen), content_type=XLSX_CONTENT_TYPE)
+    elif fmt == "html":
+        return render(request, 'standards/standard_checkliste.html', {
+            'standards': standards,
+            'rollen': rollen,
+            'fragen': fragen,
+        })
+    else:
+        return HttpResponseBadRequest("format must be html, csv or xlsx")
+    response["Content-Disposition"] = 'attachment; filename="checkliste.%s"' % fmt
+    return response
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stichworte', '0002_stichworterklaerung_order'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stichworterklaerung',
+            name='html',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:39
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+# Copy of stichworte.utils as of this migration, so later changes there do
+# not change what it writes.
+def index_felder(wort):
+    zerlegt = unicodedata.normalize("NFKD", wort.casefold())
+    schluessel = "".join(z for z in zerlegt if not unicodedata.combining(z))
+    anfang = schluessel[:1].upper()
+    return {
+        "sortierschluessel": schluessel,
+        "buchstabe": anfang if "A" <= anfang <= "Z" else "#",
+    }
+
+
+def fill_index(apps, schema_editor):
+    Stichwort = apps.get_model('stichworte', 'Stichwort')
+    stichworte = list(Stichwort.objects.all())
+    for s in stichworte:
+        for feld, wert in index_felder(s.stichwort).items():
+            setattr(s, feld, wert)
+    Stichwort.objects.bulk_update(stichworte, ['buchstabe', 'sortierschluessel'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stichworte', '0003_stichworterklaerung_html'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stichwort',
+            name='buchstabe',
+            field=models.CharField(blank=True, default='', editable=False, max_length=1),
+        ),
+        migrations.AddField(
+            model_name='stichwort',
+            name='sortierschluessel',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=100),
+        ),
+        migrations.RunPython(fill_index, migrations.RunPython.noop),
+    ]
@@ -1,12 +1,24 @@
 from django.db import models
 from abschnitte.models import Textabschnitt
+from .utils import index_felder
 
 class Stichwort(models.Model):
     stichwort = models.CharField(max_length=50, primary_key=True)
+    # index page grouping and order, derived from stichwort on save
+    buchstabe = models.CharField(max_length=1, blank=True, default='', editable=False)
+    sortierschluessel = models.CharField(max_length=100, blank=True, default='', editable=False, db_index=True)
 
     def __str__(self):
         return self.stichwort
 
+    def save(self, *args, **kwargs):
+        for feld, wert in index_felder(self.stichwort).items():
+            setattr(self, feld, wert)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "buchstabe", "sortierschluessel"}
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name_plural="Stichworte"
 
@@ -1,3 +1,19 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
-# Create your tests here.
+from .models import Stichwort
+
+
+@override_settings(DATABASE_ROUTERS=[])
+class StichwortListTest(TestCase):
+    def test_every_keyword_is_listed_once(self):
+        for wort in ("Zugang", "~Tilde", "2FA", "Übergabe", "Østerreich", "Anmeldung"):
+            Stichwort.objects.create(stichwort=wort)
+        response = self.client.get("/stichworte/")
+        gruppen = {k: [s.stichwort for s in g] for k, g in response.context["stichworte"].items()}
+        self.assertEqual(gruppen, {
+            "#": ["2FA", "~Tilde", "Østerreich"],
+            "A": ["Anmeldung"],
+            "U": ["Übergabe"],
+            "Z": ["Zugang"],
+        })
+        self.assertEqual(list(gruppen), ["#", "A", "U", "Z"])
@@ -0,0 +1,18 @@
+import unicodedata
+
+
+def sortierschluessel(wort):
+    """Sort key that ignores case and diacritics, e.g. "Übergabe" sorts like "ubergabe"."""
+    zerlegt = unicodedata.normalize("NFKD", wort.casefold())
+    return "".join(z for z in zerlegt if not unicodedata.combining(z))
+
+
+def index_felder(wort):
+    """Returns the precomputed index fields of Stichwort for wort."""
+    schluessel = sortierschluessel(wort)
+    anfang = schluessel[:1].upper()
+    return {
+        "sortierschluessel": schluessel,
+        # letters are grouped under their base letter, everything else under "#"
+        "buchstabe": anfang if "A" <= anfang <= "Z" else "#",
+    }
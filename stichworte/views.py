@@ -1,19 +1,25 @@
 from django.shortcuts import render
 from abschnitte.utils import render_textabschnitte
+from standards.models import Vorgabe
 from .models import Stichwort, Stichworterklaerung
 from itertools import groupby
-from django.db.models.functions import Lower
+from operator import attrgetter
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 
 
 
 # Create your views here.
 def stichwort_list(request):
-    qs = Stichwort.objects.order_by(Lower('stichwort'))
-    stichworte = {k: [o.stichwort for o in g] for k,g in groupby (qs, key=lambda o: o.stichwort[0].upper())}
+    aktive = (Vorgabe.objects.active_on().filter(stichworte=OuterRef("pk"))
+              .order_by().values("stichworte").annotate(anzahl=Count("pk")).values("anzahl"))
+    # "#" holds digits as well as characters sorting after "z", so group by buchstabe first
+    qs = Stichwort.objects.order_by("buchstabe", "sortierschluessel", "stichwort").annotate(anzahl=Coalesce(Subquery(aktive), 0))
+    stichworte = {k: list(g) for k,g in groupby (qs, key=attrgetter("buchstabe"))}
     return render(request, 'stichworte/stichwort_list.html', {'stichworte': stichworte})
 
 def stichwort_detail(request, stichwort):
     stichwort = Stichwort.objects.get(stichwort=stichwort)
     stichwort.erklaerung = render_textabschnitte(stichwort.stichworterklaerung_set.order_by("order"))
-    stichwort.vorgaben = stichwort.vorgabe_set.all()
+    stichwort.vorgaben = stichwort.vorgabe_set.active_on().select_related("dokument", "thema")
     return render(request, "stichworte/stichwort_detail.html", {'stichwort': stichwort})